@@ -7,18 +7,37 @@ import logging
 import unicodedata
 import threading
 import json
-from datetime import datetime
-from typing import Any, Dict, List, Tuple, Optional
+import re
+import copy
+import queue
+import cProfile
+import pstats
+import csv
+import io
+import codecs
+import hashlib
+import sqlite3
+import zipfile
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Tuple, Optional
 
 from flask import (
     Flask, render_template, request, jsonify, send_file,
-    after_this_request, Response
+    after_this_request, Response, g
 )
 
 # ---- Google Sheets / Data ----
 import gspread
 from gspread.utils import rowcol_to_a1
+from gspread.exceptions import APIError
+from gspread.http_client import HTTPClient
 from google.oauth2.service_account import Credentials
+from google.auth.transport.requests import Request as GoogleAuthRequest
+from google.auth.exceptions import GoogleAuthError
+from requests.adapters import HTTPAdapter
 
 import pandas as pd
 
@@ -30,6 +49,7 @@ from reportlab.platypus import (
     SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
 )
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.utils import ImageReader
 from reportlab.pdfgen import canvas as rl_canvas
 
 
@@ -45,6 +65,39 @@ class Config:
     # Caché (segundos)
     CACHE_TTL_SECONDS: int = int(os.getenv("CACHE_TTL", "60"))
 
+    # Cliente HTTP de Sheets: pool dimensionado a los hilos del worker
+    SHEETS_POOL_SIZE: int = int(os.getenv("SHEETS_POOL_SIZE", os.getenv("GUNICORN_THREADS", "8")))
+    SHEETS_MAX_INFLIGHT: int = int(os.getenv("SHEETS_MAX_INFLIGHT", str(SHEETS_POOL_SIZE)))
+    SHEETS_QUEUE_TIMEOUT: float = float(os.getenv("SHEETS_QUEUE_TIMEOUT", "10"))
+    SHEETS_CONNECT_TIMEOUT: float = float(os.getenv("SHEETS_CONNECT_TIMEOUT", "5"))
+    SHEETS_READ_TIMEOUT: float = float(os.getenv("SHEETS_READ_TIMEOUT", "20"))
+    SHEETS_WRITE_TIMEOUT: float = float(os.getenv("SHEETS_WRITE_TIMEOUT", "30"))
+    SHEETS_TOKEN_REFRESH_MARGIN: int = int(os.getenv("SHEETS_TOKEN_REFRESH_MARGIN", "300"))
+    SHEETS_WORKSHEET_TTL: int = int(os.getenv("SHEETS_WORKSHEET_TTL", "300"))
+
+    # PDF: logo reutilizado entre peticiones
+    PDF_LOGO_PATH: str = os.getenv("PDF_LOGO_PATH", "Logo_UNILIBRE.png")
+
+    # Orden y paginación en servidor
+    SORT_CACHE_MAX: int = int(os.getenv("SORT_CACHE_MAX", "32"))
+    PAGE_SIZE_DEFAULT: int = int(os.getenv("PAGE_SIZE_DEFAULT", "50"))
+    PAGE_SIZE_MAX: int = int(os.getenv("PAGE_SIZE_MAX", "1000"))
+
+    # Canal de eventos (SSE). Cada pestaña abierta ocupa un hilo del worker mientras
+    # dura la conexión: requiere gunicorn con hilos (-k gthread --threads N) o un
+    # worker asíncrono (gevent). Con workers sync una sola pestaña bloquea el worker.
+    # El tope deja hilos libres para las demás peticiones; al llenarse, /eventos
+    # responde 503 y el navegador vuelve a recargar tras cada cambio.
+    EVENTOS_MAX_SUSCRIPTORES: int = int(os.getenv(
+        "EVENTOS_MAX_SUSCRIPTORES", str(max(1, int(os.getenv("GUNICORN_THREADS", "8")) // 2))
+    ))
+    EVENTOS_MAX_FILAS: int = int(os.getenv("EVENTOS_MAX_FILAS", "200"))
+    EVENTOS_HEARTBEAT_SECONDS: int = int(os.getenv("EVENTOS_HEARTBEAT", "15"))
+
+    # Perfilado bajo demanda (cabecera X-Profile: 1)
+    PROFILING_ENABLED: bool = os.getenv("PROFILING_ENABLED", "0") == "1"
+    PROFILE_DIR: str = os.getenv("PROFILE_DIR", "")
+
     # Límites y JSON
     JSON_SORT_KEYS: bool = False
     MAX_CONTENT_LENGTH: int = 10 * 1024 * 1024  # 10 MB
@@ -90,6 +143,18 @@ class Config:
 
     LOCAL_DATA_JSON: str = os.getenv("LOCAL_DATA_JSON", os.path.join("static", "data.json"))
 
+    # Importación masiva
+    IMPORT_CHUNK_SIZE: int = int(os.getenv("IMPORT_CHUNK_SIZE", "500"))
+    IMPORT_EXTENSIONS: Tuple[str, ...] = (".csv", ".xlsx")
+
+    # Diario local de escrituras (se reproduce en Sheets cuando está disponible)
+    JOURNAL_PATH: str = os.getenv("JOURNAL_PATH", "diario_escrituras.sqlite3")
+    JOURNAL_BATCH_SIZE: int = int(os.getenv("JOURNAL_BATCH_SIZE", "200"))
+    JOURNAL_RETRY_SECONDS: int = int(os.getenv("JOURNAL_RETRY_SECONDS", "30"))
+    JOURNAL_CLAIM_TIMEOUT: int = int(os.getenv("JOURNAL_CLAIM_TIMEOUT", "300"))
+    JOURNAL_MAX_ATTEMPTS: int = int(os.getenv("JOURNAL_MAX_ATTEMPTS", "20"))
+    JOURNAL_WORKER: bool = os.getenv("JOURNAL_WORKER", "1") == "1"
+
 
 # Logger
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
@@ -150,6 +215,184 @@ def payload_to_row(encabezados: List[str], payload: Dict[str, Any]) -> List[str]
         fila.append(valor)
     return fila
 
+def row_version(row: List[Any]) -> str:
+    """Huella del contenido de una fila; ignora celdas vacías al final."""
+    celdas = [str(v) if v is not None else "" for v in row]
+    while celdas and not celdas[-1]:
+        celdas.pop()
+    return hashlib.sha1("\x1f".join(celdas).encode("utf-8")).hexdigest()[:16]
+
+def validar_payload(payload: Dict[str, Any]) -> Optional[str]:
+    """Reglas de campos obligatorios compartidas por /agregar, /actualizar e /importar."""
+    if not str(payload.get("proyecto_articulo") or "").strip():
+        return "El campo Proyecto/Articulo es obligatorio"
+    if not str(payload.get("estudiante1") or "").strip():
+        return "El campo Estudiante 1 es obligatorio"
+    return None
+
+
+# ============================================================================
+# Métricas (formato de texto de Prometheus)
+# ============================================================================
+
+class Metricas:
+    """Registro en memoria de contadores e histogramas con etiquetas.
+
+    Cada worker de gunicorn lleva su propio registro; /metrics expone el del
+    proceso que atiende la petición.
+    """
+
+    BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._ayuda: Dict[str, Tuple[str, str]] = {}
+        self._contadores: Dict[str, Dict[Tuple[Tuple[str, str], ...], float]] = {}
+        self._histogramas: Dict[str, Dict[Tuple[Tuple[str, str], ...], List[float]]] = {}
+
+    def inc(self, nombre: str, ayuda: str, valor: float = 1.0, **labels: Any) -> None:
+        clave = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            self._ayuda.setdefault(nombre, ("counter", ayuda))
+            serie = self._contadores.setdefault(nombre, {})
+            serie[clave] = serie.get(clave, 0.0) + valor
+
+    def observe(self, nombre: str, ayuda: str, segundos: float, **labels: Any) -> None:
+        clave = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            self._ayuda.setdefault(nombre, ("histogram", ayuda))
+            serie = self._histogramas.setdefault(nombre, {})
+            # [conteo por bucket..., suma, total]
+            datos = serie.setdefault(clave, [0.0] * (len(self.BUCKETS) + 2))
+            for i, limite in enumerate(self.BUCKETS):
+                if segundos <= limite:
+                    datos[i] += 1
+            datos[-2] += segundos
+            datos[-1] += 1
+
+    def total(self, nombre: str) -> float:
+        """Suma de un contador sobre todas sus etiquetas (0 si no existe)."""
+        with self._lock:
+            return sum(self._contadores.get(nombre, {}).values())
+
+    @contextmanager
+    def medir(self, nombre: str, ayuda: str, **labels: Any):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(nombre, ayuda, time.perf_counter() - inicio, **labels)
+
+    @staticmethod
+    def _labels(clave: Tuple[Tuple[str, str], ...], extra: Optional[Tuple[str, str]] = None) -> str:
+        pares = list(clave) + ([extra] if extra else [])
+        if not pares:
+            return ""
+        # Escapes del formato de exposición: \\, \" y \n en valores de etiqueta
+        escapar = lambda v: v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        return "{" + ",".join(f'{k}="{escapar(v)}"' for k, v in pares) + "}"
+
+    @staticmethod
+    def _valor(valor: float) -> str:
+        # Sin redondeo: {:g} deja 6 cifras y rompe rate() en contadores grandes
+        valor = float(valor)
+        return str(int(valor)) if valor.is_integer() else repr(valor)
+
+    def render(self, gauges: List[Tuple[str, str, float]]) -> str:
+        lineas: List[str] = []
+        with self._lock:
+            for nombre, serie in self._contadores.items():
+                lineas.append(f"# HELP {nombre} {self._ayuda[nombre][1]}")
+                lineas.append(f"# TYPE {nombre} counter")
+                for clave, valor in serie.items():
+                    lineas.append(f"{nombre}{self._labels(clave)} {self._valor(valor)}")
+            for nombre, serie in self._histogramas.items():
+                lineas.append(f"# HELP {nombre} {self._ayuda[nombre][1]}")
+                lineas.append(f"# TYPE {nombre} histogram")
+                for clave, datos in serie.items():
+                    for limite, conteo in zip(self.BUCKETS, datos):
+                        le = ("le", repr(limite))
+                        lineas.append(f"{nombre}_bucket{self._labels(clave, le)} {self._valor(conteo)}")
+                    lineas.append(f"{nombre}_bucket{self._labels(clave, ('le', '+Inf'))} {self._valor(datos[-1])}")
+                    lineas.append(f"{nombre}_sum{self._labels(clave)} {self._valor(datos[-2])}")
+                    lineas.append(f"{nombre}_count{self._labels(clave)} {self._valor(datos[-1])}")
+        for nombre, ayuda, valor in gauges:
+            lineas.append(f"# HELP {nombre} {ayuda}")
+            lineas.append(f"# TYPE {nombre} gauge")
+            lineas.append(f"{nombre} {self._valor(valor)}")
+        return "\n".join(lineas) + "\n"
+
+metricas = Metricas()
+
+@app.before_request
+def _iniciar_medicion():
+    g.inicio_peticion = time.perf_counter()
+    if app.config["PROFILING_ENABLED"] and request.headers.get("X-Profile") == "1":
+        g.perfil = cProfile.Profile()
+        g.perfil.enable()
+
+@app.after_request
+def _registrar_medicion(resp: Response) -> Response:
+    inicio = g.pop("inicio_peticion", None)
+    if inicio is None:
+        return resp
+    duracion = time.perf_counter() - inicio
+    endpoint = request.url_rule.rule if request.url_rule else "sin_ruta"
+    metricas.observe(
+        "proyectos_http_request_duration_seconds", "Latencia de las peticiones por endpoint",
+        duracion, endpoint=endpoint, metodo=request.method, estado=resp.status_code,
+    )
+
+    perfil = g.pop("perfil", None)
+    if perfil is not None:
+        perfil.disable()
+        salida = io.StringIO()
+        pstats.Stats(perfil, stream=salida).sort_stats("cumulative").print_stats(30)
+        logger.info("Perfil de %s %s (%.1f ms):\n%s", request.method, endpoint, duracion * 1000, salida.getvalue())
+        if app.config["PROFILE_DIR"]:
+            nombre = f"{endpoint.strip('/').replace('/', '_') or 'index'}_{int(time.time() * 1000)}.prof"
+            perfil.dump_stats(os.path.join(app.config["PROFILE_DIR"], nombre))
+        resp.headers["X-Profile-Duration-Ms"] = f"{duracion * 1000:.1f}"
+    return resp
+
+_SHEETS_OPERACIONES = {
+    "get_all_values", "append_row", "append_rows", "update",
+    "row_values", "batch_get", "batch_update",
+}
+
+class WorksheetInstrumentado:
+    """Envoltura de un Worksheet que mide y cuenta cada llamada a la API de Sheets."""
+
+    def __init__(self, ws) -> None:
+        self._ws = ws
+
+    def __getattr__(self, nombre: str):
+        attr = getattr(self._ws, nombre)
+        if nombre not in _SHEETS_OPERACIONES or not callable(attr):
+            return attr
+
+        def llamada(*args, **kwargs):
+            return sheets_call(nombre, attr, *args, **kwargs)
+        return llamada
+
+def sheets_call(operacion: str, fn, *args, **kwargs):
+    estado = "ok"
+    inicio = time.perf_counter()
+    try:
+        return fn(*args, **kwargs)
+    except Exception:
+        estado = "error"
+        raise
+    finally:
+        metricas.observe(
+            "proyectos_sheets_call_duration_seconds", "Latencia de llamadas a Google Sheets",
+            time.perf_counter() - inicio, operacion=operacion,
+        )
+        metricas.inc(
+            "proyectos_sheets_calls_total", "Llamadas a Google Sheets por operación y resultado",
+            operacion=operacion, estado=estado,
+        )
+
 
 # ============================================================================
 # Google Sheets 
@@ -162,9 +405,71 @@ _SCOPES = [
 
 _gs_client = None
 _gs_client_lock = threading.Lock()
+_gs_worksheet = {"ws": None, "ts": 0.0}
+_worksheet_factory: Optional[Callable[[], Any]] = None
+_sheets_semaphore = threading.BoundedSemaphore(max(1, Config.SHEETS_MAX_INFLIGHT))
 
 _cache_lock = threading.Lock()
-_cache_data = {"ts": 0.0, "headers": [], "rows": [], "worksheet_title": ""}
+_cache_data = {"ts": 0.0, "headers": [], "rows": [], "worksheet_title": "", "version": 0}
+# La versión del snapshot es un contador de este proceso; la instancia permite al
+# cliente notar que habla con otro proceso (reinicio u otro worker) y resincronizar
+_INSTANCIA = f"{os.getpid():x}-{int(time.time() * 1000):x}"
+
+_suscriptores: List["queue.Queue[Dict[str, Any]]"] = []
+_suscriptores_lock = threading.Lock()
+_refresco_eventos: Optional[threading.Thread] = None
+
+class PooledHTTPClient(HTTPClient):
+    """HTTPClient de gspread con conexiones keep-alive reutilizadas entre hilos,
+    timeouts de conexión/lectura por operación y un tope de llamadas en vuelo."""
+
+    def __init__(self, auth, session=None) -> None:
+        super().__init__(auth, session)
+        size = max(1, app.config["SHEETS_POOL_SIZE"])
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=size, pool_block=True)
+        self.session.mount("https://", adapter)
+        self._refresh_lock = threading.Lock()
+
+    def request(self, method, endpoint, params=None, data=None, json=None, files=None, headers=None):
+        lectura = (
+            app.config["SHEETS_READ_TIMEOUT"] if method.lower() == "get"
+            else app.config["SHEETS_WRITE_TIMEOUT"]
+        )
+        if not _sheets_semaphore.acquire(timeout=app.config["SHEETS_QUEUE_TIMEOUT"]):
+            raise TimeoutError("Demasiadas llamadas simultáneas a Google Sheets")
+        try:
+            response = self.session.request(
+                method=method, url=endpoint, json=json, params=params, data=data,
+                files=files, headers=headers,
+                timeout=(app.config["SHEETS_CONNECT_TIMEOUT"], lectura),
+            )
+        finally:
+            _sheets_semaphore.release()
+        if response.ok:
+            return response
+        raise APIError(response)
+
+    def refresh_token_if_needed(self, margen: int) -> bool:
+        """Renueva el token antes de que expire para que ninguna petición pague el viaje de auth."""
+        creds = self.auth
+        with self._refresh_lock:
+            expiry = getattr(creds, "expiry", None)
+            ahora = datetime.now(timezone.utc).replace(tzinfo=None)
+            if creds.token and expiry and expiry - ahora > timedelta(seconds=margen):
+                return False
+            creds.refresh(GoogleAuthRequest())
+            return True
+
+def _sheets_token_refresher() -> None:
+    margen = app.config["SHEETS_TOKEN_REFRESH_MARGIN"]
+    while True:
+        client = _gs_client
+        try:
+            if client is not None:
+                client.http_client.refresh_token_if_needed(margen)
+        except Exception as e:
+            logger.warning("No se pudo renovar el token de Google: %s", e)
+        time.sleep(max(30, margen // 4))
 
 def get_gspread_client():
     global _gs_client
@@ -191,13 +496,37 @@ def get_gspread_client():
                 creds = Credentials.from_service_account_file(cred_path, scopes=_SCOPES)
                 logger.info("gspread autorizado con archivo de credenciales local")
 
-            _gs_client = gspread.authorize(creds)
+            _gs_client = gspread.authorize(creds, http_client=PooledHTTPClient)
+            threading.Thread(target=_sheets_token_refresher, name="token-sheets", daemon=True).start()
         return _gs_client
 
-def get_worksheet():
+def set_worksheet_factory(factory: Optional[Callable[[], Any]]) -> None:
+    """Sustituye el origen del Worksheet (p. ej. una hoja falsa en benchmarks); None restaura Sheets."""
+    global _worksheet_factory
+    with _gs_client_lock:
+        _worksheet_factory = factory
+        _gs_worksheet.update({"ws": None, "ts": 0.0})
+    with _cache_lock:
+        _cache_data.update({"ts": 0.0, "headers": [], "rows": [], "worksheet_title": ""})
+        _cache_data["version"] += 1
+
+def _open_worksheet():
+    if _worksheet_factory is not None:
+        return _worksheet_factory()
     client = get_gspread_client()
-    sheet = client.open_by_key(app.config["SHEET_ID"])
-    return sheet.get_worksheet(0)
+    return client.open_by_key(app.config["SHEET_ID"]).get_worksheet(0)
+
+def get_worksheet():
+    # El handle de la hoja es inmutable; se reutiliza para no pagar open_by_key en cada llamada
+    now = time.time()
+    with _gs_client_lock:
+        ws = _gs_worksheet["ws"]
+        if ws is not None and now - _gs_worksheet["ts"] < app.config["SHEETS_WORKSHEET_TTL"]:
+            return ws
+    ws = WorksheetInstrumentado(sheets_call("open_by_key", _open_worksheet))
+    with _gs_client_lock:
+        _gs_worksheet.update({"ws": ws, "ts": now})
+    return ws
 
 def _load_sheet_values() -> Tuple[List[str], List[List[str]], str]:
     ws = get_worksheet()
@@ -234,30 +563,639 @@ def _get_cached_values(force: bool = False) -> Tuple[List[str], List[List[str]],
     now = time.time()
     with _cache_lock:
         if not force and _cache_data["rows"] and (now - _cache_data["ts"] < ttl):
+            metricas.inc("proyectos_cache_lookups_total", "Consultas a la caché del snapshot", resultado="hit")
             return _cache_data["headers"], _cache_data["rows"], _cache_data["worksheet_title"]
+        resultado = "stale" if _cache_data["rows"] else "miss"
+    metricas.inc("proyectos_cache_lookups_total", "Consultas a la caché del snapshot", resultado=resultado)
+
+    with metricas.medir("proyectos_snapshot_refresh_seconds", "Duración de la recarga del snapshot"):
+        try:
+            headers, rows, title = _load_sheet_values()
+        except Exception as e:
+            logger.warning("Falla Sheets, usando fallback local: %s", e)
+            metricas.inc("proyectos_snapshot_fallback_total", "Recargas servidas desde el respaldo local")
+            headers, rows, title = _load_local_values()
+
+        # Superponer y publicar bajo _journal_lock: una escritura aceptada en
+        # medio no puede quedar fuera del snapshot que se publica
+        with _journal_lock:
+            headers, rows = _apply_journal_overlay(headers, rows)
+            with _cache_lock:
+                evento = _reemplazar_snapshot(headers, rows)
+                _cache_data.update({"worksheet_title": title, "ts": time.time()})
+    publicar_evento(evento)
+    return headers, rows, title
 
-    try:
-        headers, rows, title = _load_sheet_values()
-    except Exception as e:
-        logger.warning("Falla Sheets, usando fallback local: %s", e)
-        headers, rows, title = _load_local_values()
+def _reemplazar_snapshot(headers: List[str], rows: List[List[str]]) -> Optional[Dict[str, Any]]:
+    """Sustituye filas/cabeceras del snapshot (con _cache_lock tomado).
+
+    Si el contenido cambió incrementa la versión y devuelve el evento para
+    /eventos con las filas modificadas; si son demasiadas marca ``completo``.
+    """
+    anteriores, cabeceras_previas = _cache_data["rows"], _cache_data["headers"]
+    _cache_data.update({"headers": headers, "rows": rows})
+    if cabeceras_previas == headers and anteriores == rows:
+        return None
+
+    _cache_data["version"] += 1
+    limite = app.config["EVENTOS_MAX_FILAS"]
+    completo = not anteriores or cabeceras_previas != headers
+    filas: List[int] = []
+    if not completo:
+        for i in range(max(len(anteriores), len(rows))):
+            if i >= len(anteriores) or i >= len(rows) or anteriores[i] != rows[i]:
+                filas.append(i + 2)
+                if len(filas) > limite:
+                    completo, filas = True, []
+                    break
+    return {
+        "version": _cache_data["version"], "instancia": _INSTANCIA,
+        "total": len(rows), "filas": filas, "completo": completo,
+    }
+
+def publicar_evento(evento: Optional[Dict[str, Any]]) -> None:
+    if not evento:
+        return
+    with _suscriptores_lock:
+        for cola in _suscriptores:
+            try:
+                cola.put_nowait(evento)
+            except queue.Full:
+                # El cliente detectará el salto de versión y recargará todo
+                pass
 
+def _version_snapshot(rows: List[List[str]]) -> int:
+    """Versión del snapshot al que pertenecen ``rows`` (-1 si ya fue reemplazado)."""
     with _cache_lock:
-        _cache_data.update({"headers": headers, "rows": rows, "worksheet_title": title, "ts": time.time()})
-    return headers, rows, title
+        return _cache_data["version"] if _cache_data["rows"] is rows else -1
+
+def _registro(headers: List[str], row: List[str], title: str, idx: int) -> Dict[str, Any]:
+    item = {headers[i]: (row[i] if i < len(row) else "") for i in range(len(headers))}
+    item["hoja_origen"] = title
+    item["numero_fila"] = idx
+    item["version"] = row_version(row)
+    return item
 
 def get_registros(force: bool = False) -> List[Dict[str, Any]]:
     headers, rows, title = _get_cached_values(force=force)
+    return _registros_de(headers, rows, title)
+
+def _registros_de(headers: List[str], rows: List[List[str]], title: str) -> List[Dict[str, Any]]:
     registros: List[Dict[str, Any]] = []
     if not headers or not rows:
         return registros
     for idx, row in enumerate(rows, start=2):
-        item = {headers[i]: (row[i] if i < len(row) else "") for i in range(len(headers))}
-        item["hoja_origen"] = title
-        item["numero_fila"] = idx
-        registros.append(item)
+        registros.append(_registro(headers, row, title, idx))
     return registros
 
+# ============================================================================
+# Ordenamiento
+# ============================================================================
+# Las permutaciones se calculan una vez por snapshot (identidad de la lista de
+# filas) y se reutilizan: una consulta ordenada y paginada solo recorre o corta
+# una permutación ya hecha, nunca vuelve a ordenar todo el conjunto.
+
+_MESES = {
+    "enero": 1, "febrero": 2, "marzo": 3, "abril": 4, "mayo": 5, "junio": 6, "julio": 7,
+    "agosto": 8, "septiembre": 9, "setiembre": 9, "octubre": 10, "noviembre": 11, "diciembre": 12,
+}
+_RE_FECHA_DMY = re.compile(r"^(\d{1,2})[/-](\d{1,2})[/-](\d{2}|\d{4})$")
+_RE_FECHA_YMD = re.compile(r"^(\d{4})-(\d{1,2})-(\d{1,2})$")
+
+_orden_lock = threading.Lock()
+_orden_cache: Dict[str, Any] = {"rows": None, "rangos": {}, "perms": OrderedDict()}
+
+def clave_colacion(valor: Any) -> str:
+    """Clave de orden en español: sin acentos ni mayúsculas, con la ñ entre n y o."""
+    s = str(valor or "").replace("\xa0", " ").strip().casefold()
+    s = s.replace("ñ", "n{")  # '{' va justo después de 'z' en ASCII
+    return unicodedata.normalize("NFKD", s).encode("ASCII", "ignore").decode("ASCII")
+
+def _clave_fecha(valor: str) -> Optional[Tuple[int, ...]]:
+    v = valor.strip().lower()
+    m = _RE_FECHA_DMY.match(v)
+    if m:
+        d, mes, ano = int(m.group(1)), int(m.group(2)), int(m.group(3))
+        ano += 2000 if ano < 100 else 0
+    elif _RE_FECHA_YMD.match(v):
+        ano, mes, d = (int(x) for x in _RE_FECHA_YMD.match(v).groups())
+    else:
+        partes = v.replace(" del ", " de ").split(" de ")
+        if not (len(partes) == 3 and partes[0].isdigit() and partes[2].isdigit() and partes[1] in _MESES):
+            return None
+        d, mes, ano = int(partes[0]), _MESES[partes[1]], int(partes[2])
+    try:
+        return datetime(ano, mes, d).toordinal(),
+    except ValueError:
+        return None
+
+def _clave_hora(valor: str) -> Optional[Tuple[int, ...]]:
+    v = valor.strip().lower().replace(".", "")
+    for fmt in ("%H:%M", "%I:%M %p", "%I:%M%p", "%I %p"):
+        try:
+            t = datetime.strptime(v, fmt)
+            return t.hour * 60 + t.minute,
+        except ValueError:
+            pass
+    return None
+
+def _clave_tipada(columna: str, valor: str) -> Tuple[Any, ...]:
+    """Fechas, horas y años por su valor; el resto por colación.
+
+    El primer elemento es el grupo: 0 para valores tipados, 1 para texto.
+    """
+    nombre = normalizar_texto(columna)
+    tipada: Optional[Tuple[int, ...]] = None
+    if nombre.startswith("fecha"):
+        tipada = _clave_fecha(valor)
+    elif nombre == "hora":
+        tipada = _clave_hora(valor)
+    elif nombre in ("ano", "year") and valor.strip().isdigit():
+        tipada = (int(valor.strip()),)
+    if tipada is not None:
+        return (0,) + tipada
+    return (1, clave_colacion(valor))
+
+def parse_sort(spec: Any, headers: List[str]) -> List[Tuple[int, bool]]:
+    """``"fecha_sustentacion:desc,proyecto_articulo"`` -> [(índice, descendente)].
+
+    También acepta ``-campo`` para descendente. Lanza ValueError si la columna
+    o la dirección no existen.
+    """
+    indice = _indice_columnas(headers)
+    claves: List[Tuple[int, bool]] = []
+    for parte in str(spec or "").split(","):
+        parte = parte.strip()
+        if not parte:
+            continue
+        descendente = parte.startswith("-")
+        nombre, _, direccion = parte.lstrip("-+").partition(":")
+        direccion = direccion.strip().lower()
+        if direccion not in ("", "asc", "desc"):
+            raise ValueError(f"Dirección de orden inválida: {direccion}")
+        descendente = descendente or direccion == "desc"
+        i = indice.get(normalizar_texto(nombre))
+        if i is None:
+            raise ValueError(f"Columna de orden desconocida: {nombre.strip()}")
+        claves.append((i, descendente))
+    return claves
+
+def _rangos_columna(headers: List[str], rows: List[List[str]], col: int) -> Tuple[List[int], List[int]]:
+    """Rango denso y grupo de cada fila para la columna.
+
+    Las celdas vacías reciben rango -1; el grupo separa valores tipados (0)
+    de texto no reconocido (1), p. ej. una fecha mal escrita.
+    """
+    cacheado = _orden_cache["rangos"].get(col)
+    if cacheado is not None:
+        return cacheado
+    valores = [(r[col] if col < len(r) else "").strip() for r in rows]
+    claves = [_clave_tipada(headers[col], v) if v else None for v in valores]
+    distintas = sorted({k for k in claves if k is not None})
+    posicion = {k: n for n, k in enumerate(distintas)}
+    rangos = [posicion[k] if k is not None else -1 for k in claves]
+    grupos = [k[0] if k is not None else 1 for k in claves]
+    _orden_cache["rangos"][col] = (rangos, grupos)
+    return rangos, grupos
+
+def sort_permutation(headers: List[str], rows: List[List[str]], claves: List[Tuple[int, bool]]) -> List[int]:
+    """Índices de ``rows`` en el orden pedido, precalculados por snapshot.
+
+    En ambas direcciones quedan al final el texto no reconocido en columnas
+    tipadas y, tras él, las celdas vacías; los empates conservan el orden de
+    la hoja.
+    """
+    firma = tuple(claves)
+    with _orden_lock:
+        if _orden_cache["rows"] is not rows:
+            _orden_cache.update({"rows": rows, "rangos": {}, "perms": OrderedDict()})
+        perms = _orden_cache["perms"]
+        perm = perms.get(firma)
+        if perm is not None:
+            perms.move_to_end(firma)
+            return perm
+
+        columnas = [(_rangos_columna(headers, rows, col), desc) for col, desc in claves]
+
+        def clave(i: int) -> Tuple[Any, ...]:
+            k: List[Any] = []
+            for (rangos, grupos), desc in columnas:
+                rango = rangos[i]
+                k.append(rango < 0)
+                k.append(grupos[i])
+                k.append(-rango if desc else rango)
+            return tuple(k)
+
+        perm = sorted(range(len(rows)), key=clave)
+        perms[firma] = perm
+        while len(perms) > app.config["SORT_CACHE_MAX"]:
+            perms.popitem(last=False)
+        return perm
+
+def _paginar(items: List[Any], pagina: Any, por_pagina: Any) -> Tuple[List[Any], Optional[Dict[str, int]]]:
+    """Corta ``items`` si se pidió página; devuelve además los metadatos de paginación."""
+    if pagina in (None, "") and por_pagina in (None, ""):
+        return items, None
+    try:
+        pagina_n = max(1, int(pagina or 1))
+        por_pagina_n = max(1, min(int(por_pagina or app.config["PAGE_SIZE_DEFAULT"]), app.config["PAGE_SIZE_MAX"]))
+    except (TypeError, ValueError):
+        raise ValueError("Parámetros de paginación inválidos")
+    inicio = (pagina_n - 1) * por_pagina_n
+    return items[inicio:inicio + por_pagina_n], {
+        "pagina": pagina_n,
+        "por_pagina": por_pagina_n,
+        "total": len(items),
+        "paginas": (len(items) + por_pagina_n - 1) // por_pagina_n,
+    }
+
+# ============================================================================
+# Diario de escrituras (offline)
+# ============================================================================
+# /agregar y /actualizar registran cada escritura en un diario SQLite local,
+# la aplican de inmediato a la caché servida y un hilo en segundo plano la
+# reproduce en Google Sheets, en orden y por lotes, cuando está disponible.
+
+# _journal_lock ordena las escrituras del diario con su reflejo en el snapshot
+# (se toma antes que _cache_lock); el arranque del hilo usa un lock propio
+_journal_lock = threading.Lock()
+_journal_thread_lock = threading.Lock()
+_journal_wakeup = threading.Event()
+_journal_thread: Optional[threading.Thread] = None
+_journal_status = {"ultima_sincronizacion": None, "ultimo_error": None}
+_JOURNAL_OWNER = f"{os.getpid()}-{id(_journal_wakeup)}"
+
+def _journal_conn() -> sqlite3.Connection:
+    conn = sqlite3.connect(app.config["JOURNAL_PATH"], timeout=10, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=FULL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS diario ("
+        " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+        " ts REAL NOT NULL,"
+        " op TEXT NOT NULL,"
+        " numero_fila INTEGER,"
+        " payload TEXT NOT NULL,"
+        " estado TEXT NOT NULL DEFAULT 'pendiente',"
+        " intentos INTEGER NOT NULL DEFAULT 0,"
+        " error TEXT,"
+        " reclamado_por TEXT,"
+        " reclamado_ts REAL)"
+    )
+    return conn
+
+def journal_record(op: str, payload: Dict[str, Any], numero_fila: Optional[int] = None) -> int:
+    """Guarda una escritura aceptada y la refleja en la caché servida."""
+    datos = {k: payload.get(k, "") for k in app.config["PAYLOAD_TO_SHEET"]}
+    if payload.get("version"):
+        datos["version"] = payload["version"]
+    # En la misma sección crítica: el snapshot recibe las escrituras en el orden
+    # de sus ids, que es el orden en que se reproducirán en Sheets
+    with _journal_lock:
+        conn = _journal_conn()
+        try:
+            cur = conn.execute(
+                "INSERT INTO diario (ts, op, numero_fila, payload) VALUES (?, ?, ?, ?)",
+                (time.time(), op, numero_fila, json.dumps(datos, ensure_ascii=False)),
+            )
+            entry_id = cur.lastrowid
+        finally:
+            conn.close()
+
+        with _cache_lock:
+            headers = _cache_data["headers"] or app.config["COLUMNAS"]
+            rows = _apply_journal_entries(headers, list(_cache_data["rows"]), [(op, numero_fila, datos)])
+            evento = _reemplazar_snapshot(headers, rows)
+    publicar_evento(evento)
+
+    _ensure_journal_worker()
+    _journal_wakeup.set()
+    return entry_id
+
+def _journal_pending() -> List[sqlite3.Row]:
+    conn = _journal_conn()
+    try:
+        return conn.execute(
+            "SELECT * FROM diario WHERE estado = 'pendiente' ORDER BY id"
+        ).fetchall()
+    finally:
+        conn.close()
+
+def journal_stats() -> Dict[str, Any]:
+    conn = _journal_conn()
+    try:
+        conteos = dict(conn.execute("SELECT estado, COUNT(*) FROM diario GROUP BY estado").fetchall())
+        mas_antiguo = conn.execute("SELECT MIN(ts) FROM diario WHERE estado = 'pendiente'").fetchone()[0]
+    finally:
+        conn.close()
+    if conteos.get("pendiente"):
+        _ensure_journal_worker()
+    return {
+        "pendientes": conteos.get("pendiente", 0),
+        "conflictos": conteos.get("conflicto", 0),
+        "fallidos": conteos.get("fallido", 0),
+        "pendiente_mas_antiguo": datetime.fromtimestamp(mas_antiguo).isoformat() if mas_antiguo else None,
+        **_journal_status,
+    }
+
+def _apply_journal_entries(headers: List[str], rows: List[List[str]], entradas) -> List[List[str]]:
+    for op, numero_fila, datos in entradas:
+        fila = payload_to_row(headers, datos)
+        if op == "append":
+            rows.append(fila)
+        elif op == "update" and numero_fila and 2 <= numero_fila <= len(rows) + 1:
+            rows[numero_fila - 2] = fila
+    return rows
+
+def _apply_journal_overlay(headers: List[str], rows: List[List[str]]) -> Tuple[List[str], List[List[str]]]:
+    """Superpone al snapshot recién leído las escrituras aún no enviadas."""
+    try:
+        pendientes = _journal_pending()
+    except sqlite3.Error as e:
+        logger.warning("No se pudo leer el diario local: %s", e)
+        return headers, rows
+    if not pendientes:
+        return headers, rows
+    # Tras un reinicio nadie más despertaría al hilo que reproduce lo pendiente
+    _ensure_journal_worker()
+    headers = headers or app.config["COLUMNAS"]
+    entradas = [(p["op"], p["numero_fila"], json.loads(p["payload"])) for p in pendientes]
+    return headers, _apply_journal_entries(headers, list(rows), entradas)
+
+def _journal_claim() -> List[sqlite3.Row]:
+    """Reserva las entradas pendientes; solo un proceso reproduce a la vez para conservar el orden."""
+    ahora = time.time()
+    limite = ahora - app.config["JOURNAL_CLAIM_TIMEOUT"]
+    conn = _journal_conn()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        ocupado = conn.execute(
+            "SELECT 1 FROM diario WHERE estado = 'pendiente' AND reclamado_por IS NOT NULL"
+            " AND reclamado_por != ? AND reclamado_ts > ? LIMIT 1",
+            (_JOURNAL_OWNER, limite),
+        ).fetchone()
+        if ocupado:
+            conn.execute("ROLLBACK")
+            return []
+        filas = conn.execute(
+            "SELECT * FROM diario WHERE estado = 'pendiente' ORDER BY id LIMIT ?",
+            (app.config["JOURNAL_BATCH_SIZE"],),
+        ).fetchall()
+        conn.executemany(
+            "UPDATE diario SET reclamado_por = ?, reclamado_ts = ? WHERE id = ?",
+            [(_JOURNAL_OWNER, ahora, f["id"]) for f in filas],
+        )
+        conn.execute("COMMIT")
+        return filas
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+def _journal_mark(ids: List[int], estado: str, error: Optional[str] = None) -> None:
+    if not ids:
+        return
+    conn = _journal_conn()
+    try:
+        conn.executemany(
+            "UPDATE diario SET estado = ?, error = ?, reclamado_por = NULL WHERE id = ?",
+            [(estado, error, i) for i in ids],
+        )
+    finally:
+        conn.close()
+
+def _journal_release(ids: List[int], error: Exception) -> None:
+    """Libera entradas reclamadas sin contarles intento (la falla no es suya)."""
+    if not ids:
+        return
+    conn = _journal_conn()
+    try:
+        conn.executemany(
+            "UPDATE diario SET error = ?, reclamado_por = NULL WHERE id = ?",
+            [(str(error), i) for i in ids],
+        )
+    finally:
+        conn.close()
+
+def _journal_intento(entry_id: int, error: Exception) -> str:
+    """Suma un intento a la entrada culpable; al llegar al máximo queda 'fallido'."""
+    conn = _journal_conn()
+    try:
+        conn.execute(
+            "UPDATE diario SET intentos = intentos + 1, error = ?, reclamado_por = NULL,"
+            " estado = CASE WHEN intentos + 1 >= ? THEN 'fallido' ELSE estado END WHERE id = ?",
+            (str(error), app.config["JOURNAL_MAX_ATTEMPTS"], entry_id),
+        )
+        return conn.execute("SELECT estado FROM diario WHERE id = ?", (entry_id,)).fetchone()[0]
+    finally:
+        conn.close()
+
+def journal_entries(ids: List[int]) -> List[Dict[str, Any]]:
+    """Estado de las entradas indicadas (para que el cliente sepa si su escritura llegó)."""
+    if not ids:
+        return []
+    conn = _journal_conn()
+    try:
+        filas = conn.execute(
+            f"SELECT id, op, numero_fila, estado, error FROM diario WHERE id IN ({','.join('?' * len(ids))})"
+            " ORDER BY id",
+            ids,
+        ).fetchall()
+    finally:
+        conn.close()
+    return [dict(f) for f in filas]
+
+def _error_transitorio(error: Exception) -> bool:
+    """Caídas de red, cuotas (429) y errores 5xx: se reintentan sin límite ni intento."""
+    if isinstance(error, APIError):
+        status = getattr(error.response, "status_code", None)
+        return status is None or status == 429 or status >= 500
+    return isinstance(error, (OSError, GoogleAuthError))
+
+def _evento_diario(entrada: sqlite3.Row, estado: str, error: Optional[str]) -> Dict[str, Any]:
+    return {
+        "tipo": "diario", "id": entrada["id"], "op": entrada["op"],
+        "numero_fila": entrada["numero_fila"], "estado": estado, "error": error,
+    }
+
+class _ReproduccionDiario:
+    """Reproduce en Sheets un lote reclamado del diario, por tramos del mismo tipo.
+
+    Si una llamada agrupada es rechazada por algo que no es transitorio, se
+    repite de a una entrada para que solo la culpable sume el intento; el
+    resto del lote sigue su curso. Un error transitorio corta la pasada.
+    """
+
+    def __init__(self, ws, headers: List[str], entradas: List[sqlite3.Row]) -> None:
+        self.ws = ws
+        self.headers = headers
+        self.abiertas = {e["id"] for e in entradas}
+        self.resueltas = 0
+        self.reintentar = False
+
+    def resolver(self, entrada: sqlite3.Row, estado: str, error: Optional[str] = None) -> None:
+        _journal_mark([entrada["id"]], estado, error)
+        self.abiertas.discard(entrada["id"])
+        self.resueltas += 1
+        if estado != "aplicado":
+            logger.warning("Entrada %s del diario quedó '%s': %s", entrada["id"], estado, error)
+            publicar_evento(_evento_diario(entrada, estado, error))
+
+    def fallar(self, entrada: sqlite3.Row, error: Exception) -> None:
+        estado = _journal_intento(entrada["id"], error)
+        self.abiertas.discard(entrada["id"])
+        if estado == "fallido":
+            self.resueltas += 1
+            publicar_evento(_evento_diario(entrada, estado, str(error)))
+        else:
+            self.reintentar = True
+        logger.warning("Entrada %s del diario rechazada (%s): %s", entrada["id"], estado, error)
+
+    def aislando(self, items: List[Tuple[sqlite3.Row, Any]], llamada) -> List[Tuple[sqlite3.Row, Any]]:
+        """Ejecuta ``llamada`` con los datos de ``items``; devuelve los que se completaron
+        emparejados con su resultado (``llamada`` devuelve una lista alineada o None)."""
+        if not items:
+            return []
+        try:
+            resultado = llamada([d for _, d in items])
+        except Exception as e:
+            if _error_transitorio(e):
+                raise
+            if len(items) == 1:
+                self.fallar(items[0][0], e)
+                return []
+            hechos: List[Tuple[sqlite3.Row, Any]] = []
+            for item in items:
+                hechos.extend(self.aislando([item], llamada))
+            return hechos
+        resultado = resultado if resultado is not None else [None] * len(items)
+        return [(entrada, r) for (entrada, _), r in zip(items, resultado)]
+
+    def _datos(self, entrada: sqlite3.Row) -> Optional[Dict[str, Any]]:
+        try:
+            return json.loads(entrada["payload"])
+        except Exception as e:
+            self.fallar(entrada, e)
+            return None
+
+    def append(self, tramo: List[sqlite3.Row]) -> None:
+        items = []
+        for entrada in tramo:
+            datos = self._datos(entrada)
+            if datos is not None:
+                items.append((entrada, payload_to_row(self.headers, datos)))
+
+        def escribir(filas):
+            self.ws.append_rows(filas, value_input_option="USER_ENTERED")
+
+        for entrada, _ in self.aislando(items, escribir):
+            self.resolver(entrada, "aplicado")
+
+    def update(self, tramo: List[sqlite3.Row]) -> None:
+        items = []
+        for entrada in tramo:
+            n = entrada["numero_fila"]
+            if not n or n < 2:
+                self.resolver(entrada, "fallido", f"Número de fila inválido: {n}")
+                continue
+            datos = self._datos(entrada)
+            if datos is not None:
+                items.append((entrada, datos))
+
+        # Se lee justo antes de escribir: las filas agregadas por tramos previos
+        # del mismo lote ya están en la hoja y se comparan contra su versión real
+        def leer(numeros):
+            return self.ws.batch_get([f"{n}:{n}" for n in numeros])
+
+        lecturas = self.aislando([(e, e["numero_fila"]) for e, d in items if d.get("version")], leer)
+        leidas = {e["id"] for e, _ in lecturas}
+        actuales = {e["numero_fila"]: (v[0] if v else []) for e, v in lecturas}
+
+        cambios = []
+        for entrada, datos in items:
+            n = entrada["numero_fila"]
+            if datos.get("version"):
+                if entrada["id"] not in leidas:
+                    continue
+                if row_version(actuales.get(n, [])) != datos["version"]:
+                    self.resolver(entrada, "conflicto", "La fila cambió desde que se cargó")
+                    continue
+            fila = payload_to_row(self.headers, datos)
+            actuales[n] = fila
+            cambios.append((entrada, {"range": rowcol_to_a1(n, 1), "values": [fila]}))
+
+        def escribir(datos):
+            self.ws.batch_update(datos, value_input_option="USER_ENTERED")
+
+        for entrada, _ in self.aislando(cambios, escribir):
+            self.resolver(entrada, "aplicado")
+
+def replay_journal() -> int:
+    """Envía a Sheets las entradas pendientes, en orden.
+
+    Devuelve cuántas se resolvieron (aplicadas, en conflicto o fallidas).
+    """
+    resueltas = 0
+    while True:
+        entradas = _journal_claim()
+        if not entradas:
+            break
+
+        rep: Optional[_ReproduccionDiario] = None
+        try:
+            ws = get_worksheet()
+            leidos = ws.batch_get(["1:1"])
+            headers = (leidos[0][0] if leidos and leidos[0] else []) or app.config["COLUMNAS"]
+            rep = _ReproduccionDiario(ws, headers, entradas)
+
+            # Tramos consecutivos del mismo tipo: append_rows / batch_update conservando el orden
+            i = 0
+            while i < len(entradas):
+                op = entradas[i]["op"]
+                j = i
+                while j < len(entradas) and entradas[j]["op"] == op:
+                    j += 1
+                (rep.append if op == "append" else rep.update)(entradas[i:j])
+                i = j
+        except Exception as e:
+            abiertas = rep.abiertas if rep else {x["id"] for x in entradas}
+            _journal_release(sorted(abiertas), e)
+            raise
+        finally:
+            if rep:
+                resueltas += rep.resueltas
+
+        if rep.reintentar:
+            # Las rechazadas esperan al siguiente ciclo en vez de reintentarse en caliente
+            break
+    return resueltas
+
+def _journal_worker() -> None:
+    while app.config["JOURNAL_WORKER"]:
+        _journal_wakeup.wait(timeout=app.config["JOURNAL_RETRY_SECONDS"])
+        _journal_wakeup.clear()
+        if not app.config["JOURNAL_WORKER"]:
+            break
+        try:
+            if replay_journal():
+                _get_cached_values(force=True)
+            _journal_status["ultima_sincronizacion"] = datetime.now().isoformat()
+            _journal_status["ultimo_error"] = None
+        except Exception as e:
+            _journal_status["ultimo_error"] = str(e)
+            logger.warning("No se pudo sincronizar el diario con Sheets: %s", e)
+
+def _ensure_journal_worker() -> None:
+    global _journal_thread
+    if not app.config["JOURNAL_WORKER"]:
+        return
+    with _journal_thread_lock:
+        if _journal_thread is None or not _journal_thread.is_alive():
+            _journal_thread = threading.Thread(target=_journal_worker, name="diario-sheets", daemon=True)
+            _journal_thread.start()
+
 
 # ============================================================================
 # Rutas
@@ -284,8 +1222,21 @@ def verificar_conexion():
 @app.route("/mostrar_todos", methods=["GET"])
 def mostrar_todos():
     try:
-        registros = get_registros(force=False)
-        resp = jsonify({"resultados": registros})
+        headers, rows, title = _get_cached_values(force=False)
+        try:
+            claves = parse_sort(request.args.get("sort"), headers)
+            orden = sort_permutation(headers, rows, claves) if claves else range(len(rows))
+            indices, paginacion = _paginar(orden, request.args.get("pagina"), request.args.get("por_pagina"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        registros = [_registro(headers, rows[i], title, i + 2) for i in indices] if headers else []
+        body: Dict[str, Any] = {
+            "resultados": registros, "version": _version_snapshot(rows), "instancia": _INSTANCIA,
+        }
+        if paginacion:
+            body["paginacion"] = paginacion
+        resp = jsonify(body)
         resp.headers["Cache-Control"] = "public, max-age=30"
         return resp
     except Exception as e:
@@ -297,18 +1248,32 @@ def buscar():
     try:
         data = request.get_json(silent=True) or {}
         termino: str = (data.get("termino") or "").strip()
-        registros = get_registros(force=False)
-        if not termino:
-            return jsonify({"resultados": registros})
-
-        needle = normalizar_texto(termino)
-        columnas = app.config["COLUMNAS"]
-        resultados: List[Dict[str, Any]] = []
-        for r in registros:
-            campos = [normalizar_texto(r.get(c, "")) for c in columnas]
-            if any(needle in c for c in campos if c):
-                resultados.append(r)
-        return jsonify({"resultados": resultados})
+        headers, rows, title = _get_cached_values(force=False)
+        if not headers:
+            return jsonify({"resultados": []})
+        try:
+            claves = parse_sort(data.get("sort") or request.args.get("sort"), headers)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        orden = sort_permutation(headers, rows, claves) if claves else range(len(rows))
+
+        if termino:
+            needle = normalizar_texto(termino)
+            columnas = set(app.config["COLUMNAS"])
+            buscables = [i for i, h in enumerate(headers) if h in columnas]
+            orden = [
+                i for i in orden
+                if any(needle in normalizar_texto(rows[i][c]) for c in buscables if c < len(rows[i]))
+            ]
+
+        try:
+            indices, paginacion = _paginar(orden, data.get("pagina"), data.get("por_pagina"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        body: Dict[str, Any] = {"resultados": [_registro(headers, rows[i], title, i + 2) for i in indices]}
+        if paginacion:
+            body["paginacion"] = paginacion
+        return jsonify(body)
     except Exception as e:
         logger.exception("Error en busqueda")
         return jsonify({"error": f"Error en la busqueda: {e}"}), 500
@@ -317,19 +1282,13 @@ def buscar():
 def agregar():
     try:
         payload = request.get_json(silent=True) or {}
-        if not payload.get("proyecto_articulo"):
-            return jsonify({"error": "El campo Proyecto/Articulo es obligatorio"}), 400
-        if not payload.get("estudiante1"):
-            return jsonify({"error": "El campo Estudiante 1 es obligatorio"}), 400
-
-        # Solo intentamos escribir si hay Google Sheets
-        ws = get_worksheet()
-        headers = ws.row_values(1) or app.config["COLUMNAS"]
-        nueva_fila = payload_to_row(headers, payload)
-        ws.append_row(nueva_fila, value_input_option="USER_ENTERED")
+        error = validar_payload(payload)
+        if error:
+            return jsonify({"error": error}), 400
 
-        _get_cached_values(force=True)
-        return jsonify({"mensaje": "Registro agregado exitosamente a Google Sheets"})
+        # Se acepta en el diario local; la réplica a Sheets ocurre en segundo plano
+        entry_id = journal_record("append", payload)
+        return jsonify({"mensaje": "Registro guardado; se sincronizará con Google Sheets", "diario_id": entry_id, "instancia": _INSTANCIA})
     except Exception as e:
         logger.exception("Error al agregar")
         return jsonify({"error": f"Error al agregar registro: {e}"}), 500
@@ -338,26 +1297,404 @@ def agregar():
 def actualizar():
     try:
         payload = request.get_json(silent=True) or {}
-        if not payload.get("proyecto_articulo"):
-            return jsonify({"error": "El campo Proyecto/Articulo es obligatorio"}), 400
-        if not payload.get("estudiante1"):
-            return jsonify({"error": "El campo Estudiante 1 es obligatorio"}), 400
+        error = validar_payload(payload)
+        if error:
+            return jsonify({"error": error}), 400
         if not payload.get("numero_fila"):
             return jsonify({"error": "Número de fila no especificado"}), 400
 
-        numero_fila = int(payload["numero_fila"])
-        ws = get_worksheet()
-        headers = ws.row_values(1) or app.config["COLUMNAS"]
-        fila_actualizada = payload_to_row(headers, payload)
-        start_a1 = rowcol_to_a1(numero_fila, 1)
-        ws.update(start_a1, [fila_actualizada], value_input_option="USER_ENTERED")
-
-        _get_cached_values(force=True)
-        return jsonify({"mensaje": "Registro actualizado exitosamente en Google Sheets"})
+        try:
+            numero_fila = int(payload["numero_fila"])
+        except (TypeError, ValueError):
+            return jsonify({"error": "Número de fila inválido"}), 400
+
+        # Se valida contra el snapshot servido (incluye escrituras pendientes);
+        # al reproducir el diario se vuelve a comprobar contra la hoja
+        _, rows, title = _get_cached_values(force=False)
+        if not 2 <= numero_fila <= len(rows) + 1:
+            return jsonify({"error": "Número de fila inválido"}), 400
+        version = payload.get("version")
+        if title == "LOCAL" and not version:
+            # Con el respaldo local los números de fila no son los de la hoja: sin
+            # versión la réplica sobrescribiría a ciegas otra fila
+            return jsonify({
+                "error": "Google Sheets no está disponible. Recargue los datos antes de editar"
+            }), 409
+        if version:
+            if row_version(rows[numero_fila - 2]) != version:
+                return jsonify({
+                    "error": "La fila cambió desde que se cargó. Recargue los datos antes de editar"
+                }), 409
+
+        entry_id = journal_record("update", payload, numero_fila)
+        return jsonify({"mensaje": "Cambios guardados; se sincronizarán con Google Sheets", "diario_id": entry_id, "instancia": _INSTANCIA})
     except Exception as e:
         logger.exception("Error al actualizar")
         return jsonify({"error": f"Error al actualizar registro: {e}"}), 500
 
+@app.route("/actualizar_lote", methods=["POST"])
+def actualizar_lote():
+    """Actualiza varias filas en un solo batch_update.
+
+    Cada item lleva ``numero_fila``, ``version`` (la huella recibida en
+    /mostrar_todos) y solo los campos a modificar. Las filas cuya huella no
+    coincide con la lectura recién hecha se rechazan en vez de sobrescribirse.
+    Escribe directo en Sheets, así que las filas con escrituras del diario aún
+    sin sincronizar se rechazan: su huella solo existe en la caché servida.
+    """
+    try:
+        payload = request.get_json(silent=True) or {}
+        items = payload.get("items")
+        if not isinstance(items, list) or not items:
+            return jsonify({"error": "No hay elementos para actualizar"}), 400
+
+        rechazados: List[Dict[str, Any]] = []
+        pendientes: Dict[int, Dict[str, Any]] = {}
+        for item in items:
+            try:
+                numero_fila = int(item.get("numero_fila"))
+            except (TypeError, ValueError, AttributeError):
+                rechazados.append({"numero_fila": None, "error": "Número de fila no especificado"})
+                continue
+            if numero_fila < 2:
+                rechazados.append({"numero_fila": numero_fila, "error": "Número de fila inválido"})
+            elif not item.get("version"):
+                rechazados.append({"numero_fila": numero_fila, "error": "Versión de fila no especificada"})
+            elif numero_fila in pendientes:
+                rechazados.append({"numero_fila": numero_fila, "error": "Fila repetida en el lote"})
+            else:
+                pendientes[numero_fila] = item
+
+        try:
+            en_diario = _journal_pending()
+        except sqlite3.Error as e:
+            logger.warning("No se pudo leer el diario local: %s", e)
+            en_diario = []
+        filas_en_diario = {p["numero_fila"] for p in en_diario if p["op"] == "update"}
+        altas_en_diario = any(p["op"] == "append" for p in en_diario)
+        for numero_fila in sorted(filas_en_diario & set(pendientes)):
+            del pendientes[numero_fila]
+            rechazados.append({
+                "numero_fila": numero_fila,
+                "error": "La fila tiene cambios pendientes de sincronizar con Google Sheets",
+            })
+
+        if not pendientes:
+            return jsonify({"actualizados": [], "rechazados": rechazados}), 400
+
+        # Una sola lectura: cabeceras + cada fila afectada
+        ws = get_worksheet()
+        filas = sorted(pendientes)
+        rangos = ["1:1"] + [f"{n}:{n}" for n in filas]
+        leidos = ws.batch_get(rangos)
+        headers = (leidos[0][0] if leidos and leidos[0] else []) or app.config["COLUMNAS"]
+        por_hoja = {h_sheet: k for k, h_sheet in app.config["PAYLOAD_TO_SHEET"].items()}
+
+        cambios: List[Dict[str, Any]] = []
+        actualizados: List[int] = []
+        for numero_fila, valores in zip(filas, leidos[1:]):
+            item = pendientes[numero_fila]
+            actual = list(valores[0]) if valores else []
+            version_actual = row_version(actual)
+            if not actual and version_actual != item["version"]:
+                # Fila vacía o más allá del final: no existe (o solo existe en el diario)
+                rechazados.append({
+                    "numero_fila": numero_fila,
+                    "error": (
+                        "La fila aún está pendiente de sincronizar con Google Sheets"
+                        if altas_en_diario else "La fila no existe en la hoja"
+                    ),
+                })
+                continue
+            if version_actual != item["version"]:
+                rechazados.append({
+                    "numero_fila": numero_fila,
+                    "error": "La fila cambió desde que se cargó",
+                    "version_actual": version_actual,
+                })
+                continue
+
+            # Campos no enviados conservan el valor actual de la hoja
+            fusion: Dict[str, Any] = {}
+            for i, h in enumerate(headers):
+                clave = por_hoja.get(h.strip())
+                if clave:
+                    fusion[clave] = item[clave] if clave in item else (actual[i] if i < len(actual) else "")
+            error = validar_payload(fusion)
+            if error:
+                rechazados.append({"numero_fila": numero_fila, "error": error})
+                continue
+
+            fila = payload_to_row(headers, fusion)
+            for i, h in enumerate(headers):
+                if h.strip() not in por_hoja and i < len(actual):
+                    fila[i] = actual[i]
+            cambios.append({"range": rowcol_to_a1(numero_fila, 1), "values": [fila]})
+            actualizados.append(numero_fila)
+
+        if cambios:
+            ws.batch_update(cambios, value_input_option="USER_ENTERED")
+            _get_cached_values(force=True)
+
+        status = 200 if actualizados or not rechazados else 409
+        return jsonify({
+            "mensaje": f"Se actualizaron {len(actualizados)} registros",
+            "actualizados": actualizados,
+            "rechazados": rechazados,
+        }), status
+    except Exception as e:
+        logger.exception("Error en actualización por lote")
+        return jsonify({"error": f"Error al actualizar registros: {e}"}), 500
+
+@app.route("/diario", methods=["GET"])
+def estado_diario():
+    """Estado de escrituras aceptadas (``ids`` = diario_id devueltos por /agregar y /actualizar)."""
+    try:
+        ids: List[int] = []
+        for v in (request.args.get("ids") or "").split(","):
+            if v.strip():
+                try:
+                    ids.append(int(v))
+                except ValueError:
+                    return jsonify({"error": f"Identificador inválido: {v}"}), 400
+        return jsonify({"entradas": journal_entries(ids[:500])})
+    except Exception as e:
+        logger.exception("Error consultando el diario")
+        return jsonify({"error": f"Error al consultar el diario: {e}"}), 500
+
+# ----------------------------------------------------------------------------
+# Importación masiva (CSV / XLSX)
+# ----------------------------------------------------------------------------
+
+def _import_column_map(encabezados: List[Any]) -> Dict[int, str]:
+    """Índice de columna del archivo -> clave de payload (acepta clave o nombre de hoja)."""
+    por_nombre: Dict[str, str] = {}
+    for k_payload, h_sheet in app.config["PAYLOAD_TO_SHEET"].items():
+        por_nombre[normalizar_texto(k_payload)] = k_payload
+        por_nombre[normalizar_texto(h_sheet)] = k_payload
+    mapa: Dict[int, str] = {}
+    for i, h in enumerate(encabezados):
+        clave = por_nombre.get(normalizar_texto(h))
+        if clave and clave not in mapa.values():
+            mapa[i] = clave
+    return mapa
+
+def _codificacion_csv(stream) -> str:
+    """Detecta la codificación del CSV: UTF-8 o, si no lo es, la de Excel en español (cp1252)."""
+    for codificacion in ("utf-8-sig", "cp1252"):
+        decoder = codecs.getincrementaldecoder(codificacion)()
+        try:
+            stream.seek(0)
+            while True:
+                bloque = stream.read(64 * 1024)
+                if not bloque:
+                    decoder.decode(b"", final=True)
+                    return codificacion
+                decoder.decode(bloque)
+        except UnicodeDecodeError:
+            continue
+        finally:
+            stream.seek(0)
+    return "latin-1"
+
+def _iter_import_rows(archivo) -> Any:
+    """Genera las filas del archivo subido sin materializarlo completo.
+
+    Un archivo dañado o con otro formato se informa como ValueError.
+    """
+    nombre = (archivo.filename or "").lower()
+    if nombre.endswith(".csv"):
+        codificacion = _codificacion_csv(archivo.stream)
+        texto = io.TextIOWrapper(archivo.stream, encoding=codificacion, newline="")
+        try:
+            muestra = texto.read(4096)
+            texto.seek(0)
+            try:
+                dialecto = csv.Sniffer().sniff(muestra, delimiters=",;\t")
+            except csv.Error:
+                dialecto = csv.excel
+            try:
+                yield from csv.reader(texto, dialecto)
+            except csv.Error as e:
+                raise ValueError(f"El CSV no es válido: {e}") from e
+        finally:
+            texto.detach()
+    else:
+        from openpyxl import load_workbook
+        from openpyxl.utils.exceptions import InvalidFileException
+        try:
+            wb = load_workbook(archivo.stream, read_only=True, data_only=True)
+        except (zipfile.BadZipFile, InvalidFileException, KeyError, OSError) as e:
+            raise ValueError("El archivo XLSX está dañado o no es un libro de Excel") from e
+        try:
+            for fila in wb.worksheets[0].iter_rows(values_only=True):
+                yield ["" if v is None else v for v in fila]
+        except (zipfile.BadZipFile, KeyError) as e:
+            raise ValueError("El archivo XLSX está dañado o no es un libro de Excel") from e
+        finally:
+            wb.close()
+
+def _celda_import(valor: Any) -> str:
+    if isinstance(valor, datetime):
+        return valor.strftime("%d/%m/%Y")
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return str(valor).strip()
+
+@app.route("/importar", methods=["POST"])
+def importar():
+    try:
+        archivo = request.files.get("archivo")
+        if archivo is None or not archivo.filename:
+            return jsonify({"error": "No se recibió ningún archivo"}), 400
+        if not archivo.filename.lower().endswith(app.config["IMPORT_EXTENSIONS"]):
+            return jsonify({"error": "Formato no soportado. Use CSV o XLSX"}), 400
+
+        filas = _iter_import_rows(archivo)
+        try:
+            encabezados = next(filas, None)
+            if not encabezados:
+                return jsonify({"error": "El archivo está vacío"}), 400
+            mapa = _import_column_map(encabezados)
+            if not mapa:
+                return jsonify({"error": "El archivo no tiene columnas reconocidas"}), 400
+
+            # Una lectura de cabeceras y luego escrituras por bloques
+            ws = get_worksheet()
+            headers = ws.row_values(1) or app.config["COLUMNAS"]
+
+            validas: List[List[str]] = []
+            origen: List[int] = []
+            errores: List[Dict[str, Any]] = []
+            total = 0
+            for num, fila in enumerate(filas, start=2):
+                if not any(str(v).strip() for v in fila):
+                    continue
+                total += 1
+                payload = {clave: _celda_import(fila[i]) for i, clave in mapa.items() if i < len(fila)}
+                error = validar_payload(payload)
+                if error:
+                    errores.append({"fila": num, "error": error})
+                    continue
+                validas.append(payload_to_row(headers, payload))
+                origen.append(num)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        chunk = max(1, app.config["IMPORT_CHUNK_SIZE"])
+        for i in range(0, len(validas), chunk):
+            try:
+                ws.append_rows(validas[i:i + chunk], value_input_option="USER_ENTERED")
+            except Exception as e:
+                # Los bloques anteriores ya están en la hoja: se informa desde dónde reanudar
+                logger.exception("Error al importar el bloque que inicia en la fila %s", origen[i])
+                if i:
+                    _get_cached_values(force=True)
+                return jsonify({
+                    "error": f"Error al escribir en Google Sheets: {e}",
+                    "total": total,
+                    "importados": i,
+                    "primera_fila_no_importada": origen[i],
+                    "errores": errores,
+                }), 502
+
+        if validas:
+            _get_cached_values(force=True)
+        return jsonify({
+            "mensaje": f"Se importaron {len(validas)} de {total} registros",
+            "total": total,
+            "importados": len(validas),
+            "errores": errores,
+        })
+    except Exception as e:
+        logger.exception("Error al importar")
+        return jsonify({"error": f"Error al importar archivo: {e}"}), 500
+
+# ----------------------------------------------------------------------------
+# Eventos de cambios (SSE)
+# ----------------------------------------------------------------------------
+
+@app.route("/filas", methods=["GET"])
+def obtener_filas():
+    """Devuelve solo las filas indicadas en ``ids`` (números de fila de la hoja)."""
+    try:
+        ids: List[int] = []
+        for v in (request.args.get("ids") or "").split(","):
+            if v.strip():
+                try:
+                    ids.append(int(v))
+                except ValueError:
+                    return jsonify({"error": f"Número de fila inválido: {v}"}), 400
+        headers, rows, title = _get_cached_values(force=False)
+        resultados = [
+            _registro(headers, rows[n - 2], title, n)
+            for n in ids if 2 <= n <= len(rows) + 1
+        ]
+        return jsonify({
+            "resultados": resultados, "total": len(rows),
+            "version": _version_snapshot(rows), "instancia": _INSTANCIA,
+        })
+    except Exception as e:
+        logger.exception("Error obteniendo filas")
+        return jsonify({"error": f"Error al obtener filas: {e}"}), 500
+
+def _refrescar_para_eventos() -> None:
+    # Mientras haya navegadores suscritos, la caché se recarga sola al vencer el TTL
+    # y cada cambio detectado se difunde a todos ellos
+    global _refresco_eventos
+    while True:
+        time.sleep(max(1, app.config["CACHE_TTL_SECONDS"]))
+        with _suscriptores_lock:
+            if not _suscriptores:
+                _refresco_eventos = None
+                return
+        try:
+            _get_cached_values(force=False)
+        except Exception as e:
+            logger.warning("No se pudo refrescar el snapshot para /eventos: %s", e)
+
+@app.route("/eventos", methods=["GET"])
+def eventos():
+    """Canal SSE de cambios del snapshot; ocupa un hilo por suscriptor (ver Config)."""
+    global _refresco_eventos
+    cola: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=100)
+    with _suscriptores_lock:
+        if len(_suscriptores) >= app.config["EVENTOS_MAX_SUSCRIPTORES"]:
+            metricas.inc("proyectos_eventos_rechazados_total", "Conexiones a /eventos rechazadas por el tope")
+            resp = jsonify({"error": "Demasiadas conexiones de eventos abiertas; intente más tarde"})
+            resp.headers["Retry-After"] = "60"
+            return resp, 503
+        _suscriptores.append(cola)
+        if _refresco_eventos is None:
+            _refresco_eventos = threading.Thread(target=_refrescar_para_eventos, name="eventos-sse", daemon=True)
+            _refresco_eventos.start()
+    with _cache_lock:
+        version = _cache_data["version"]
+
+    def stream():
+        try:
+            inicial = {"version": version, "instancia": _INSTANCIA}
+            yield f"retry: 5000\nevent: version\ndata: {json.dumps(inicial)}\n\n"
+            while True:
+                try:
+                    evento = cola.get(timeout=app.config["EVENTOS_HEARTBEAT_SECONDS"])
+                except queue.Empty:
+                    yield ": ping\n\n"
+                    continue
+                if evento.get("tipo") == "diario":
+                    yield f"event: diario\ndata: {json.dumps(evento)}\n\n"
+                    continue
+                yield f"id: {evento['version']}\nevent: cambio\ndata: {json.dumps(evento)}\n\n"
+        finally:
+            with _suscriptores_lock:
+                if cola in _suscriptores:
+                    _suscriptores.remove(cola)
+
+    return Response(stream(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
 # ----------------------------------------------------------------------------
 # PDF - Solo columnas especificas
 # ----------------------------------------------------------------------------
@@ -384,6 +1721,7 @@ class NumberedCanvas(rl_canvas.Canvas):
         txt = f"Página {self._pageNumber} de {page_count}"
         self.drawRightString(self._pagesize[0] - 1.5*cm, 1.1*cm, txt)
 
+@lru_cache(maxsize=1)
 def _styles():
     base = getSampleStyleSheet()
     
@@ -474,39 +1812,54 @@ def _row_from_record(r, cell, cell_bold):
         _p(articulo_monografia, cell),
     ]
 
+@lru_cache(maxsize=1)
+def _logo_asset():
+    """Logo decodificado una sola vez por proceso: (ImageReader, ancho, alto) o None."""
+    logo_path = app.config["PDF_LOGO_PATH"]
+    if not os.path.exists(logo_path):
+        return None
+    try:
+        img = ImageReader(logo_path)
+        iw, ih = img.getSize()
+        scale = min(2.5*cm/iw, 1.5*cm/ih)
+        return img, iw*scale, ih*scale
+    except Exception as e:
+        logger.warning("No se pudo cargar el logo para PDF: %s", e)
+        return None
+
 def _header_logo(canvas, doc):
     width, height = doc.pagesize
-    canvas.saveState()
-    
-    # Fondo de encabezado
-    canvas.setFillColor(colors.HexColor("#B71C1C"))
-    canvas.rect(0, height-2.0*cm, width, 2.0*cm, stroke=0, fill=1)
-    
-    # Logo 
-    try:
-        logo_path = "Logo_UNILIBRE.png"
-        if os.path.exists(logo_path):
-            from reportlab.lib.utils import ImageReader
-            img = ImageReader(logo_path)
-            iw, ih = img.getSize()
-            max_h = 1.5*cm
-            scale = min(2.5*cm/iw, max_h/ih)
-            lw, lh = iw*scale, ih*scale
+
+    # El encabezado se dibuja una vez como XObject del documento y cada
+    # página solo lo referencia, así el logo se incrusta una sola vez
+    if not canvas.hasForm("encabezado"):
+        canvas.beginForm("encabezado")
+        canvas.saveState()
+
+        # Fondo de encabezado
+        canvas.setFillColor(colors.HexColor("#B71C1C"))
+        canvas.rect(0, height-2.0*cm, width, 2.0*cm, stroke=0, fill=1)
+
+        # Logo 
+        logo = _logo_asset()
+        if logo is not None:
+            img, lw, lh = logo
             canvas.drawImage(
                 img, 1.0*cm, height - 1.8*cm, 
                 width=lw, height=lh, mask='auto'
             )
-    except Exception:
-        pass
-    
-    # Texto institucional
-    canvas.setFillColor(colors.white)
-    canvas.setFont("Helvetica-Bold", 12)
-    canvas.drawString(4*cm, height - 1.4*cm, "UNIVERSIDAD LIBRE")
-    canvas.setFont("Helvetica", 9)
-    canvas.drawString(4*cm, height - 1.8*cm, "Sistema de Gestion de Proyectos Academicos")
-    
-    canvas.restoreState()
+
+        # Texto institucional
+        canvas.setFillColor(colors.white)
+        canvas.setFont("Helvetica-Bold", 12)
+        canvas.drawString(4*cm, height - 1.4*cm, "UNIVERSIDAD LIBRE")
+        canvas.setFont("Helvetica", 9)
+        canvas.drawString(4*cm, height - 1.8*cm, "Sistema de Gestion de Proyectos Academicos")
+
+        canvas.restoreState()
+        canvas.endForm()
+
+    canvas.doForm("encabezado")
 
 def _footer_info(canvas, doc):
     width, height = doc.pagesize
@@ -516,158 +1869,161 @@ def _footer_info(canvas, doc):
     canvas.setFont("Helvetica", 7)
     canvas.setFillColor(colors.HexColor("#666666"))
     
-    fecha_export = datetime.now().strftime("%d/%m/%Y %H:%M")
+    fecha_export = getattr(doc, "fecha_export", None) or datetime.now().strftime("%d/%m/%Y %H:%M")
     canvas.drawString(1.5*cm, 1.0*cm, f"Generado: {fecha_export}")
     canvas.drawCentredString(width/2, 1.0*cm, "Confidencial - Uso interno")
     
     canvas.restoreState()
 
-@app.route("/exportar_pdf", methods=["POST"])
-def exportar_pdf():
-    try:
-        payload = request.get_json(silent=True) or {}
-        datos = payload.get("datos", [])
-        if not datos:
-            return jsonify({"error": "No hay datos para exportar"}), 400
-
-        tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
-        pdf_path = tmp.name
-        tmp.close()
-
-       
-        page_size = landscape(A4)
-        doc = SimpleDocTemplate(
-            pdf_path, pagesize=page_size,
-            leftMargin=1.0*cm, rightMargin=1.0*cm, 
-            topMargin=2.5*cm, bottomMargin=1.5*cm,
-            title="Listado de Proyectos Académicos - Universidad Libre",
-            author="Sistema de Gestion de Proyectos",
-        )
-
-        title, subtitle, header, cell, cell_bold = _styles()
-        elements: List[Any] = []
-
-        # Títulos
-        elements.append(Spacer(1, 5))
-        elements.append(Paragraph("LISTADO DE PROYECTOS ACADEMICOS", title))
-        
-        fecha_export = datetime.now().strftime("%d/%m/%Y %H:%M")
-        elements.append(Paragraph(
-            f"Exportado el {fecha_export} • {len(datos)} registros encontrados", 
-            subtitle
-        ))
-        elements.append(Spacer(1, 8))
-
-        # Cabeceras de tabla - SOLO LAS COLUMNAS SOLICITADAS
-        headers = [
-            Paragraph("Proyecto/Artículo", header),
-            Paragraph("Programa", header),
-            Paragraph("Estudiante 1", header),
-            Paragraph("Estudiante 2", header),
-            Paragraph("Evaluadores", header),
-            Paragraph("Artículo/Monografía", header),
-        ]
-
-        # Preparar datos de la tabla
-        table_data = [headers]
-        for r in datos:
-            try:
-                table_data.append(_row_from_record(r, cell, cell_bold))
-            except Exception as e:
-                logger.warning("Error procesando registro para PDF: %s", e)
-                continue
-
-        # Anchos de columnas optimizados para las 6 columnas solicitadas
-        col_widths = [
-            4.5*cm,   # Proyecto/Artículo
-            2.5*cm,   # Programa
-            3.0*cm,   # Estudiante 1
-            3.0*cm,   # Estudiante 2  
-            4.0*cm,   # Evaluadores
-            3.0*cm,   # Artículo/Monografía
-        ]
-        
-        # Calcular ancho total
-        total_width = sum(col_widths)
-        available_width = page_size[0] - 2.0*cm
-        
-        # Ajustar anchos si es necesario
-        if total_width > available_width:
-            scale_factor = available_width / total_width
-            col_widths = [w * scale_factor for w in col_widths]
-        
-        table = Table(table_data, colWidths=col_widths, repeatRows=1)
+@lru_cache(maxsize=1)
+def _pdf_table_style() -> TableStyle:
+    return TableStyle([
+        # Encabezados
+        ('BACKGROUND', (0,0), (-1,0), colors.HexColor("#B71C1C")),
+        ('TEXTCOLOR', (0,0), (-1,0), colors.white),
+        ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
+        ('FONTSIZE',  (0,0), (-1,0), 9),
+        ('ALIGN', (0,0), (-1,0), 'CENTER'),
+        ('VALIGN', (0,0), (-1,0), 'MIDDLE'),
+        ('BOTTOMPADDING', (0,0), (-1,0), 8),
+        ('TOPPADDING', (0,0), (-1,0), 8),
+
+        # Filas alternas
+        ('ROWBACKGROUNDS', (0,1), (-1,-1), 
+         [colors.HexColor("#F8F9FA"), colors.white]),
         
-        # Estilo de tabla optimizado
-        table.setStyle(TableStyle([
-            # Encabezados
-            ('BACKGROUND', (0,0), (-1,0), colors.HexColor("#B71C1C")),
-            ('TEXTCOLOR', (0,0), (-1,0), colors.white),
-            ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
-            ('FONTSIZE',  (0,0), (-1,0), 9),
-            ('ALIGN', (0,0), (-1,0), 'CENTER'),
-            ('VALIGN', (0,0), (-1,0), 'MIDDLE'),
-            ('BOTTOMPADDING', (0,0), (-1,0), 8),
-            ('TOPPADDING', (0,0), (-1,0), 8),
-
-            # Filas alternas
-            ('ROWBACKGROUNDS', (0,1), (-1,-1), 
-             [colors.HexColor("#F8F9FA"), colors.white]),
-            
-            # Bordes y alineación
-            ('GRID', (0,0), (-1,-1), 0.5, colors.HexColor("#D1D5DB")),
-            ('FONTNAME', (0,1), (-1,-1), 'Helvetica'),
-            ('FONTSIZE', (0,1), (-1,-1), 8),
-            ('LEADING', (0,1), (-1,-1), 9.5),
-            ('VALIGN', (0,1), (-1,-1), 'TOP'),
-            ('LEFTPADDING', (0,0), (-1,-1), 5),
-            ('RIGHTPADDING', (0,0), (-1,-1), 5),
-            ('TOPPADDING', (0,1), (-1,-1), 4),
-            ('BOTTOMPADDING', (0,1), (-1,-1), 4),
-            
-            # Alineación específica
-            ('ALIGN', (1,1), (1,-1), 'CENTER'),  # Programa al centro
-            ('ALIGN', (5,1), (5,-1), 'CENTER'),  # Artículo/Monografía al centro
-        ]))
-
-        elements.append(table)
+        # Bordes y alineación
+        ('GRID', (0,0), (-1,-1), 0.5, colors.HexColor("#D1D5DB")),
+        ('FONTNAME', (0,1), (-1,-1), 'Helvetica'),
+        ('FONTSIZE', (0,1), (-1,-1), 8),
+        ('LEADING', (0,1), (-1,-1), 9.5),
+        ('VALIGN', (0,1), (-1,-1), 'TOP'),
+        ('LEFTPADDING', (0,0), (-1,-1), 5),
+        ('RIGHTPADDING', (0,0), (-1,-1), 5),
+        ('TOPPADDING', (0,1), (-1,-1), 4),
+        ('BOTTOMPADDING', (0,1), (-1,-1), 4),
         
-        # Resumen al final
-        elements.append(Spacer(1, 10))
-        elements.append(Paragraph(
-            f"<b>Resumen:</b> Se exportaron {len(datos)} proyectos académicos con información básica.", 
-            ParagraphStyle(
-                'Summary', 
-                parent=cell, 
-                fontSize=8, 
-                textColor=colors.HexColor("#666666"),
-                alignment=1
-            )
-        ))
-
-        def _on_each_page(canvas, doc_):
-            _header_logo(canvas, doc_)
-            _footer_info(canvas, doc_)
+        # Alineación específica
+        ('ALIGN', (1,1), (1,-1), 'CENTER'),  # Programa al centro
+        ('ALIGN', (5,1), (5,-1), 'CENTER'),  # Artículo/Monografía al centro
+    ])
+
+@lru_cache(maxsize=1)
+def _pdf_header_templates() -> Tuple[Paragraph, ...]:
+    # Cabeceras de tabla - SOLO LAS COLUMNAS SOLICITADAS
+    header = _styles()[2]
+    return tuple(Paragraph(t, header) for t in (
+        "Proyecto/Artículo", "Programa", "Estudiante 1",
+        "Estudiante 2", "Evaluadores", "Artículo/Monografía",
+    ))
+
+@lru_cache(maxsize=1)
+def _summary_style() -> ParagraphStyle:
+    return ParagraphStyle(
+        'Summary', 
+        parent=_styles()[3], 
+        fontSize=8, 
+        textColor=colors.HexColor("#666666"),
+        alignment=1
+    )
 
+def _render_pdf(datos: List[Dict[str, Any]], fecha_export: str) -> bytes:
+    buffer = io.BytesIO()
+    page_size = landscape(A4)
+    doc = SimpleDocTemplate(
+        buffer, pagesize=page_size,
+        leftMargin=1.0*cm, rightMargin=1.0*cm, 
+        topMargin=2.5*cm, bottomMargin=1.5*cm,
+        title="Listado de Proyectos Académicos - Universidad Libre",
+        author="Sistema de Gestion de Proyectos",
+    )
+    # El pie de página imprime la misma fecha que el encabezado
+    doc.fecha_export = fecha_export
+
+    title, subtitle, header, cell, cell_bold = _styles()
+    elements: List[Any] = []
+
+    # Títulos
+    elements.append(Spacer(1, 5))
+    elements.append(Paragraph("LISTADO DE PROYECTOS ACADEMICOS", title))
+    elements.append(Paragraph(
+        f"Exportado el {fecha_export} • {len(datos)} registros encontrados", 
+        subtitle
+    ))
+    elements.append(Spacer(1, 8))
+
+    # Copias superficiales: comparten el texto ya parseado pero no el estado
+    # de maquetación, así varias exportaciones simultáneas no se pisan
+    headers = [copy.copy(p) for p in _pdf_header_templates()]
+
+    # Preparar datos de la tabla
+    table_data = [headers]
+    for r in datos:
+        try:
+            table_data.append(_row_from_record(r, cell, cell_bold))
+        except Exception as e:
+            logger.warning("Error procesando registro para PDF: %s", e)
+            continue
+
+    # Anchos de columnas optimizados para las 6 columnas solicitadas
+    col_widths = [
+        4.5*cm,   # Proyecto/Artículo
+        2.5*cm,   # Programa
+        3.0*cm,   # Estudiante 1
+        3.0*cm,   # Estudiante 2  
+        4.0*cm,   # Evaluadores
+        3.0*cm,   # Artículo/Monografía
+    ]
+    
+    # Calcular ancho total
+    total_width = sum(col_widths)
+    available_width = page_size[0] - 2.0*cm
+    
+    # Ajustar anchos si es necesario
+    if total_width > available_width:
+        scale_factor = available_width / total_width
+        col_widths = [w * scale_factor for w in col_widths]
+    
+    table = Table(table_data, colWidths=col_widths, repeatRows=1)
+    table.setStyle(_pdf_table_style())
+    elements.append(table)
+    
+    # Resumen al final
+    elements.append(Spacer(1, 10))
+    elements.append(Paragraph(
+        f"<b>Resumen:</b> Se exportaron {len(datos)} proyectos académicos con información básica.", 
+        _summary_style()
+    ))
+
+    def _on_each_page(canvas, doc_):
+        _header_logo(canvas, doc_)
+        _footer_info(canvas, doc_)
+
+    with metricas.medir("proyectos_export_render_seconds", "Tiempo de generación de exportaciones", formato="pdf"):
         doc.build(
             elements, 
             onFirstPage=_on_each_page, 
             onLaterPages=_on_each_page, 
             canvasmaker=NumberedCanvas
         )
+    return buffer.getvalue()
 
-        @after_this_request
-        def cleanup(response):
-            try: 
-                os.remove(pdf_path)
-            except Exception: 
-                pass
-            return response
+@app.route("/exportar_pdf", methods=["POST"])
+def exportar_pdf():
+    try:
+        payload = request.get_json(silent=True) or {}
+        datos = payload.get("datos", [])
+        if not datos:
+            return jsonify({"error": "No hay datos para exportar"}), 400
+
+        # Sin caché de PDFs terminados: el documento imprime la hora de exportación
+        ahora = datetime.now()
+        pdf = _render_pdf(datos, ahora.strftime("%d/%m/%Y %H:%M"))
 
         return send_file(
-            pdf_path,
+            io.BytesIO(pdf),
             as_attachment=True,
-            download_name=f'proyectos_academicos_{datetime.now().strftime("%Y%m%d_%H%M")}.pdf',
+            download_name=f'proyectos_academicos_{ahora.strftime("%Y%m%d_%H%M")}.pdf',
             mimetype='application/pdf'
         )
     except Exception as e:
@@ -675,20 +2031,133 @@ def exportar_pdf():
         return jsonify({"error": f"Error al exportar PDF: {e}"}), 500
 
 # ----------------------------------------------------------------------------
-# Excel
+# Excel / CSV
 # ----------------------------------------------------------------------------
+
+HOJA_ORIGEN = "Hoja Origen"
+
+def _indice_columnas(headers: List[str]) -> Dict[str, int]:
+    """Nombre normalizado (cabecera de hoja o clave de payload) -> índice de columna."""
+    indice = {normalizar_texto(h): i for i, h in enumerate(headers)}
+    for k_payload, h_sheet in app.config["PAYLOAD_TO_SHEET"].items():
+        i = indice.get(normalizar_texto(h_sheet))
+        if i is not None:
+            indice.setdefault(normalizar_texto(k_payload), i)
+    return indice
+
+def _parametros_exportacion(headers: List[str]):
+    """Lee de la query string ``termino``, ``filtro_<columna>`` y ``columnas``.
+
+    Devuelve (índices a exportar, incluir hoja origen, predicado de fila) o
+    lanza ValueError si se nombra una columna inexistente.
+    """
+    indice = _indice_columnas(headers)
+    desconocidas: List[str] = []
+
+    columnas_param = (request.args.get("columnas") or "").strip()
+    if columnas_param:
+        seleccion: List[int] = []
+        incluir_hoja = False
+        for nombre in (c.strip() for c in columnas_param.split(",")):
+            if not nombre:
+                continue
+            if normalizar_texto(nombre) == normalizar_texto(HOJA_ORIGEN):
+                incluir_hoja = True
+            elif normalizar_texto(nombre) in indice:
+                seleccion.append(indice[normalizar_texto(nombre)])
+            else:
+                desconocidas.append(nombre)
+    else:
+        seleccion, incluir_hoja = list(range(len(headers))), True
+
+    filtros: List[Tuple[int, str]] = []
+    for clave, valor in request.args.items():
+        if not clave.startswith("filtro_") or not valor.strip():
+            continue
+        nombre = clave[len("filtro_"):]
+        if normalizar_texto(nombre) in indice:
+            filtros.append((indice[normalizar_texto(nombre)], normalizar_texto(valor)))
+        else:
+            desconocidas.append(nombre)
+
+    if desconocidas:
+        raise ValueError(f"Columnas desconocidas: {', '.join(desconocidas)}")
+
+    needle = normalizar_texto(request.args.get("termino") or "")
+    columnas_busqueda = {normalizar_texto(c) for c in app.config["COLUMNAS"]}
+    buscables = [i for i, h in enumerate(headers) if normalizar_texto(h) in columnas_busqueda]
+
+    def coincide(row: List[str]) -> bool:
+        for i, valor in filtros:
+            if (normalizar_texto(row[i]) if i < len(row) else "") != valor:
+                return False
+        if needle:
+            return any(i < len(row) and needle in normalizar_texto(row[i]) for i in buscables)
+        return True
+
+    return seleccion, incluir_hoja, coincide
+
+def _filas_exportacion(rows: List[List[str]], title: str, seleccion: List[int], incluir_hoja: bool, coincide):
+    for row in rows:
+        if not coincide(row):
+            continue
+        fila = [row[i] if i < len(row) else "" for i in seleccion]
+        if incluir_hoja:
+            fila.append(title)
+        yield fila
+
+@app.route("/exportar_csv", methods=["GET"])
+def exportar_csv():
+    try:
+        headers, rows, title = _get_cached_values(force=False)
+        if not rows:
+            return jsonify({"error": "No hay datos para exportar"}), 400
+        try:
+            seleccion, incluir_hoja, coincide = _parametros_exportacion(headers)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        columnas = [headers[i] for i in seleccion] + ([HOJA_ORIGEN] if incluir_hoja else [])
+
+        def generar():
+            # Se escribe en un búfer pequeño que se vacía cada pocas filas
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            buf.write("\ufeff")
+            writer.writerow(columnas)
+            for n, fila in enumerate(_filas_exportacion(rows, title, seleccion, incluir_hoja, coincide), start=1):
+                writer.writerow(fila)
+                if n % 500 == 0:
+                    yield buf.getvalue()
+                    buf.seek(0)
+                    buf.truncate()
+            yield buf.getvalue()
+
+        nombre = f'proyectos_{datetime.now().strftime("%Y%m%d_%H%M")}.csv'
+        return Response(
+            generar(),
+            mimetype="text/csv",
+            headers={"Content-Disposition": f'attachment; filename="{nombre}"'},
+        )
+    except Exception as e:
+        logger.exception("Error exportando CSV")
+        return jsonify({"error": f"Error exportando CSV: {e}"}), 500
+
 @app.route("/exportar_excel", methods=["GET"])
 def exportar_excel():
     try:
         headers, rows, title = _get_cached_values(force=False)
         if not rows:
             return jsonify({"error": "No hay datos para exportar"}), 400
-
-        columnas = headers + ["Hoja Origen"]
-        datos_tabla: List[List[str]] = []
-        for row in rows:
-            full_row = row + [""] * max(0, len(headers) - len(row))
-            datos_tabla.append(full_row + [title])
+        try:
+            seleccion, incluir_hoja, coincide = _parametros_exportacion(headers)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        columnas = [headers[i] for i in seleccion] + ([HOJA_ORIGEN] if incluir_hoja else [])
+        datos_tabla = list(_filas_exportacion(rows, title, seleccion, incluir_hoja, coincide))
+        if not datos_tabla:
+            return jsonify({"error": "No hay datos para exportar"}), 400
 
         df = pd.DataFrame(datos_tabla, columns=columnas)
 
@@ -702,16 +2171,17 @@ def exportar_excel():
             except Exception: pass
             return response
 
-        with pd.ExcelWriter(excel_path, engine="openpyxl") as writer:
-            df.to_excel(writer, sheet_name="Proyectos_Academicos", index=False)
-            ws = writer.sheets["Proyectos_Academicos"]
-            for col_cells in ws.columns:
-                max_len = 0
-                col_letter = col_cells[0].column_letter
-                for cell in col_cells:
-                    try: max_len = max(max_len, len(str(cell.value)))
-                    except Exception: pass
-                ws.column_dimensions[col_letter].width = min(max_len + 2, 50)
+        with metricas.medir("proyectos_export_render_seconds", "Tiempo de generación de exportaciones", formato="excel"):
+            with pd.ExcelWriter(excel_path, engine="openpyxl") as writer:
+                df.to_excel(writer, sheet_name="Proyectos_Academicos", index=False)
+                ws = writer.sheets["Proyectos_Academicos"]
+                for col_cells in ws.columns:
+                    max_len = 0
+                    col_letter = col_cells[0].column_letter
+                    for cell in col_cells:
+                        try: max_len = max(max_len, len(str(cell.value)))
+                        except Exception: pass
+                    ws.column_dimensions[col_letter].width = min(max_len + 2, 50)
 
         return send_file(
             excel_path,
@@ -871,9 +2341,28 @@ def health_check():
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
         "sheet_id": app.config["SHEET_ID"],
-        "cache_ttl": app.config["CACHE_TTL_SECONDS"]
+        "cache_ttl": app.config["CACHE_TTL_SECONDS"],
+        "diario": journal_stats(),
     })
 
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    with _cache_lock:
+        filas = len(_cache_data["rows"])
+        ts = _cache_data["ts"]
+    gauges = [
+        ("proyectos_snapshot_rows", "Filas en el snapshot servido", filas),
+        ("proyectos_snapshot_age_seconds", "Antigüedad del snapshot servido", time.time() - ts if ts else 0),
+    ]
+    with _suscriptores_lock:
+        gauges.append(("proyectos_eventos_suscriptores", "Conexiones abiertas a /eventos", len(_suscriptores)))
+    try:
+        gauges.append(("proyectos_journal_pending", "Escrituras pendientes de enviar a Sheets",
+                       journal_stats()["pendientes"]))
+    except sqlite3.Error as e:
+        logger.warning("No se pudo leer el diario local: %s", e)
+    return Response(metricas.render(gauges), mimetype="text/plain; version=0.0.4")
+
 
 # ============================================================================
 # Bootstrap
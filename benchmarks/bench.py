@@ -0,0 +1,267 @@
+"""Benchmarks de los endpoints principales contra una hoja falsa en memoria.
+
+Uso:
+    python -m benchmarks.bench --escalas 1000,10000,100000 --salida bench_results.json
+    python -m benchmarks.bench --escalas 1000 --comparar bench_anterior.json
+
+Cada caso se mide con el cliente de pruebas de Flask y el reporte JSON
+(percentiles en ms por escala y caso) puede compararse entre ejecuciones.
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+import app as proyectos
+from benchmarks.fake_sheets import FakeWorksheet, generar_filas
+
+
+def _percentil(valores: List[float], p: float) -> float:
+    ordenados = sorted(valores)
+    k = (len(ordenados) - 1) * p
+    bajo = int(k)
+    alto = min(bajo + 1, len(ordenados) - 1)
+    return ordenados[bajo] + (ordenados[alto] - ordenados[bajo]) * (k - bajo)
+
+
+FALLBACK = "proyectos_snapshot_fallback_total"
+
+
+def medir(nombre: str, escala: int, iteraciones: int, fn: Callable[[int], Any]) -> Dict[str, Any]:
+    tiempos: List[float] = []
+    errores = 0
+    respaldos = 0
+    reintentos = 0
+    bytes_resp = 0
+    for i in range(iteraciones):
+        respaldos_antes = proyectos.metricas.total(FALLBACK)
+        inicio = time.perf_counter()
+        try:
+            resp = fn(i)
+        except Exception as e:
+            # Con --tasa-cuota los 429 son esperables: cuentan como error de la iteración
+            if not proyectos._error_transitorio(e):
+                raise
+            resp = SimpleNamespace(status_code=599)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+        # Servir desde el respaldo local mide respuestas vacías: también es un error
+        respaldo = proyectos.metricas.total(FALLBACK) > respaldos_antes
+        respaldos += respaldo
+        # Los casos que no pasan por HTTP (p. ej. el diario) no tienen respuesta
+        if getattr(resp, "status_code", 200) >= 400 or respaldo:
+            errores += 1
+        reintentos += getattr(resp, "reintentos", 0)
+        bytes_resp = len(resp.get_data()) if hasattr(resp, "get_data") else 0
+    resultado = {
+        "caso": nombre,
+        "escala": escala,
+        "iteraciones": iteraciones,
+        "errores": errores,
+        "respaldo_local": respaldos,
+        "reintentos": reintentos,
+        "bytes_respuesta": bytes_resp,
+        "min_ms": round(min(tiempos), 3),
+        "p50_ms": round(_percentil(tiempos, 0.50), 3),
+        "p95_ms": round(_percentil(tiempos, 0.95), 3),
+        "media_ms": round(statistics.fmean(tiempos), 3),
+    }
+    print(f"  {nombre:<28} p50={resultado['p50_ms']:>10.2f} ms  p95={resultado['p95_ms']:>10.2f} ms"
+          f"  errores={errores}  reintentos={reintentos}", flush=True)
+    return resultado
+
+
+def _payload(i: int) -> Dict[str, str]:
+    return {
+        "proyecto_articulo": f"Proyecto de benchmark {i}",
+        "programa": "Ingeniería de Sistemas",
+        "estudiante1": f"Estudiante {i}",
+        "convocatoria": "2025-1",
+        "ano": "2025",
+    }
+
+
+def vaciar_diario(i: int) -> SimpleNamespace:
+    """Reproduce el diario hasta dejarlo vacío; los errores transitorios se reintentan."""
+    reintentos = 0
+    while True:
+        try:
+            proyectos.replay_journal()
+        except Exception as e:
+            if not proyectos._error_transitorio(e) or reintentos >= 1000:
+                raise
+            reintentos += 1
+            continue
+        if not proyectos.journal_stats()["pendientes"]:
+            return SimpleNamespace(status_code=200, reintentos=reintentos)
+
+
+def cargar_snapshot(intentos: int = 100) -> None:
+    """Deja cargado el snapshot real de la hoja (no el respaldo local) antes de un caso."""
+    for _ in range(intentos):
+        antes = proyectos.metricas.total(FALLBACK)
+        proyectos._get_cached_values(force=True)
+        if proyectos.metricas.total(FALLBACK) == antes:
+            return
+    raise RuntimeError("No se pudo leer la hoja falsa; baje --tasa-cuota")
+
+
+def ejecutar_escala(escala: int, args: argparse.Namespace) -> List[Dict[str, Any]]:
+    ws = FakeWorksheet(
+        generar_filas(escala, seed=escala),
+        latencia_ms=args.latencia_ms,
+        tasa_cuota=args.tasa_cuota,
+    )
+    proyectos.set_worksheet_factory(lambda: ws)
+    client = proyectos.app.test_client()
+    n = args.iteraciones
+    print(f"Escala {escala} filas", flush=True)
+
+    def caso(nombre: str, iteraciones: int, fn: Callable[[int], Any]) -> Dict[str, Any]:
+        cargar_snapshot()
+        antes = dict(ws.llamadas)
+        resultado = medir(nombre, escala, iteraciones, fn)
+        resultado["llamadas_sheets"] = {
+            op: total - antes.get(op, 0) for op, total in ws.llamadas.items() if total != antes.get(op, 0)
+        }
+        return resultado
+
+    def registros_actuales() -> List[Dict[str, Any]]:
+        cargar_snapshot()
+        return client.get("/mostrar_todos").get_json()["resultados"]
+
+    def mostrar_todos_frio(i: int):
+        # Caducar el snapshot obliga a recargarlo desde la hoja
+        with proyectos._cache_lock:
+            proyectos._cache_data["ts"] = 0.0
+        return client.get("/mostrar_todos")
+
+    resultados = [
+        caso("mostrar_todos_frio", n, mostrar_todos_frio),
+        caso("mostrar_todos", n, lambda i: client.get("/mostrar_todos")),
+        caso("mostrar_todos_ordenado", n, lambda i: client.get(
+            "/mostrar_todos?sort=fecha_sustentacion:desc,proyecto_articulo&pagina=1&por_pagina=50")),
+        caso("buscar", n, lambda i: client.post("/buscar", json={"termino": "gomez"})),
+        caso("estadisticas_detalladas", n, lambda i: client.get("/estadisticas-detalladas")),
+        caso("exportar_excel", max(1, n // 2), lambda i: client.get("/exportar_excel")),
+        caso("exportar_csv", n, lambda i: client.get("/exportar_csv")),
+    ]
+
+    datos_pdf = registros_actuales()[:args.pdf_filas]
+    resultados.append(caso("exportar_pdf", max(1, n // 2),
+                           lambda i: client.post("/exportar_pdf", json={"datos": datos_pdf})))
+
+    # /agregar y /actualizar solo encolan en el diario; su envío a la hoja se mide
+    # aparte vaciando el diario de forma síncrona (el hilo de fondo está apagado)
+    resultados.append(caso("agregar", n, lambda i: client.post("/agregar", json=_payload(i))))
+    resultados.append(caso("diario_agregar", 1, vaciar_diario))
+
+    registros = registros_actuales()
+    resultados.append(caso("actualizar", n, lambda i: client.post("/actualizar", json={
+        **_payload(i), "numero_fila": registros[i]["numero_fila"],
+    })))
+    resultados.append(caso("diario_actualizar", 1, vaciar_diario))
+
+    lote = [
+        {"numero_fila": r["numero_fila"], "version": r["version"], "trabajo_final": "Aprobado"}
+        for r in registros_actuales()[n:n + args.lote]
+    ]
+    resultados.append(caso("actualizar_lote", 1,
+                           lambda i: client.post("/actualizar_lote", json={"items": lote})))
+
+    encabezado = ",".join(proyectos.app.config["PAYLOAD_TO_SHEET"])
+    lineas = [encabezado] + [
+        ",".join(_payload(i).get(k, "") for k in proyectos.app.config["PAYLOAD_TO_SHEET"])
+        for i in range(args.lote)
+    ]
+    csv_bytes = ("\n".join(lineas) + "\n").encode("utf-8")
+    resultados.append(caso("importar_csv", 1, lambda i: client.post(
+        "/importar", data={"archivo": (io.BytesIO(csv_bytes), "lote.csv")},
+        content_type="multipart/form-data",
+    )))
+
+    pendientes = proyectos.journal_stats()["pendientes"]
+    if pendientes:
+        raise RuntimeError(f"Quedaron {pendientes} escrituras sin reproducir en la escala {escala}")
+    return resultados
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return None
+
+
+def comparar(actual: Dict[str, Any], anterior: Dict[str, Any]) -> None:
+    previos = {(r["escala"], r["caso"]): r for r in anterior.get("resultados", [])}
+    print("\nComparación p50 (actual vs anterior)")
+    for r in actual["resultados"]:
+        p = previos.get((r["escala"], r["caso"]))
+        if not p or not p["p50_ms"]:
+            continue
+        delta = (r["p50_ms"] - p["p50_ms"]) / p["p50_ms"] * 100
+        print(f"  {r['escala']:>7} {r['caso']:<28} {p['p50_ms']:>10.2f} -> {r['p50_ms']:>10.2f} ms ({delta:+.1f}%)")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escalas", default="1000,10000,100000", help="Tamaños de la hoja, separados por coma")
+    parser.add_argument("--iteraciones", type=int, default=5)
+    parser.add_argument("--latencia-ms", type=float, default=0.0, help="Latencia simulada por llamada a Sheets")
+    parser.add_argument("--tasa-cuota", type=float, default=0.0, help="Probabilidad de error 429 por llamada")
+    parser.add_argument("--pdf-filas", type=int, default=1000, help="Filas enviadas a /exportar_pdf")
+    parser.add_argument("--lote", type=int, default=100, help="Filas para /actualizar_lote e /importar")
+    parser.add_argument("--salida", default="bench_results.json")
+    parser.add_argument("--comparar", help="Reporte JSON previo contra el cual comparar")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Diario y respaldo local aislados del entorno real
+        proyectos.app.config["JOURNAL_PATH"] = os.path.join(tmp, "diario.sqlite3")
+        proyectos.app.config["LOCAL_DATA_JSON"] = os.path.join(tmp, "sin_respaldo.json")
+        # Sin hilo de fondo: sus réplicas se mezclarían con las llamadas de otros casos
+        proyectos.app.config["JOURNAL_WORKER"] = False
+        # Con cuota simulada los errores son esperables y se cuentan por caso
+        proyectos.logger.setLevel("CRITICAL" if args.tasa_cuota else "WARNING")
+
+        resultados: List[Dict[str, Any]] = []
+        for escala in (int(e) for e in args.escalas.split(",") if e.strip()):
+            resultados.extend(ejecutar_escala(escala, args))
+        proyectos.set_worksheet_factory(None)
+
+    reporte = {
+        "meta": {
+            "fecha": datetime.now().isoformat(),
+            "commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "plataforma": platform.platform(),
+            "latencia_ms": args.latencia_ms,
+            "tasa_cuota": args.tasa_cuota,
+            "iteraciones": args.iteraciones,
+            "pdf_filas": args.pdf_filas,
+        },
+        "resultados": resultados,
+    }
+    with open(args.salida, "w", encoding="utf-8") as fh:
+        json.dump(reporte, fh, ensure_ascii=False, indent=2)
+    print(f"\nReporte guardado en {args.salida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as fh:
+            comparar(reporte, json.load(fh))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
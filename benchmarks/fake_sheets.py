@@ -0,0 +1,161 @@
+"""Hoja de cálculo falsa en memoria para medir la app sin tocar Google Sheets.
+
+Implementa el subconjunto de ``gspread.Worksheet`` que usa ``app.py`` y permite
+simular latencia de red y errores de cuota (HTTP 429).
+"""
+from __future__ import annotations
+
+import json
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import requests
+from gspread.exceptions import APIError
+from gspread.utils import a1_to_rowcol
+
+from app import Config
+
+PROGRAMAS = [
+    "Ingeniería de Sistemas", "Ingeniería Industrial", "Ingeniería Ambiental",
+    "Ingeniería Mecánica", "Administración de Empresas", "Contaduría Pública",
+]
+NOMBRES = ["Ana", "Andrés", "Camila", "Carlos", "Daniela", "Felipe", "Juliana", "Mateo", "Sofía", "Óscar", "Valentina"]
+APELLIDOS = ["Gómez", "Rodríguez", "Martínez", "López", "Pérez", "Díaz", "Muñoz", "Rojas", "Álvarez", "Zúñiga"]
+ESTADOS = ["Aprobado", "Aprobada", "En revisión", "Pendiente", "No aprobado", ""]
+TEMAS = ["Sistema", "Análisis", "Modelo", "Plataforma", "Evaluación", "Diseño", "Optimización"]
+OBJETOS = ["de inventarios", "de riesgos", "energético", "para PYMES", "de calidad del agua", "logístico"]
+
+
+def _persona(rnd: random.Random) -> str:
+    return f"{rnd.choice(NOMBRES)} {rnd.choice(APELLIDOS)}"
+
+
+def generar_filas(n: int, seed: int = 42) -> List[List[str]]:
+    """Filas sintéticas de proyectos con la forma de ``Config.COLUMNAS``."""
+    rnd = random.Random(seed)
+    filas: List[List[str]] = []
+    for i in range(n):
+        ano = rnd.randint(2015, 2025)
+        fila = {
+            "Proyecto/Articulo": f"{rnd.choice(TEMAS)} {rnd.choice(OBJETOS)} {i}",
+            "Programa": rnd.choice(PROGRAMAS),
+            "Estudiante 1": _persona(rnd),
+            "Estudiante 2": _persona(rnd) if rnd.random() < 0.6 else "",
+            "Asesor": _persona(rnd),
+            "Evaluador 1": _persona(rnd),
+            "Evaluador 2": _persona(rnd) if rnd.random() < 0.7 else "",
+            "Evaluador 3": _persona(rnd) if rnd.random() < 0.3 else "",
+            "Hora": f"{rnd.randint(7, 18):02d}:{rnd.choice(['00', '30'])}",
+            "Propuesta": rnd.choice(ESTADOS),
+            "Anteproyecto": rnd.choice(ESTADOS),
+            "Trabajo final": rnd.choice(ESTADOS),
+            "Fecha sustentación": f"{rnd.randint(1, 28):02d}/{rnd.randint(1, 12):02d}/{ano}",
+            "Convocatoria": f"{ano}-{rnd.choice([1, 2])}",
+            "ARTICULO/MONOGRAFIA": rnd.choice(["ARTICULO", "MONOGRAFIA"]),
+            "Año": str(ano),
+        }
+        filas.append([fila[c] for c in Config.COLUMNAS])
+    return filas
+
+
+def _error_cuota() -> APIError:
+    resp = requests.Response()
+    resp.status_code = 429
+    resp._content = json.dumps({"error": {
+        "code": 429, "status": "RESOURCE_EXHAUSTED",
+        "message": "Quota exceeded for quota metric 'Read requests' (simulado)",
+    }}).encode("utf-8")
+    return APIError(resp)
+
+
+def _recortar(fila: List[str]) -> List[str]:
+    # La API de Sheets no devuelve celdas vacías al final de una fila
+    fila = list(fila)
+    while fila and not fila[-1]:
+        fila.pop()
+    return fila
+
+
+class FakeWorksheet:
+    """Worksheet en memoria con latencia y errores de cuota configurables."""
+
+    def __init__(
+        self,
+        filas: List[List[str]],
+        latencia_ms: float = 0.0,
+        tasa_cuota: float = 0.0,
+        title: str = "Hoja1",
+        seed: int = 0,
+    ) -> None:
+        self.title = title
+        self._valores: List[List[str]] = [list(Config.COLUMNAS)] + [list(f) for f in filas]
+        self._latencia = latencia_ms / 1000.0
+        self._tasa_cuota = tasa_cuota
+        self._rnd = random.Random(seed)
+        self._lock = threading.Lock()
+        self.llamadas: Dict[str, int] = {}
+
+    def _llamada(self, operacion: str) -> None:
+        with self._lock:
+            self.llamadas[operacion] = self.llamadas.get(operacion, 0) + 1
+            fallar = self._tasa_cuota and self._rnd.random() < self._tasa_cuota
+        if self._latencia:
+            time.sleep(self._latencia)
+        if fallar:
+            raise _error_cuota()
+
+    # ---- Lecturas ----
+    def get_all_values(self, *args: Any, **kwargs: Any) -> List[List[str]]:
+        self._llamada("get_all_values")
+        with self._lock:
+            return [list(f) for f in self._valores]
+
+    def row_values(self, row: int, *args: Any, **kwargs: Any) -> List[str]:
+        self._llamada("row_values")
+        with self._lock:
+            return _recortar(self._valores[row - 1]) if row <= len(self._valores) else []
+
+    def batch_get(self, ranges: List[str], *args: Any, **kwargs: Any) -> List[List[List[str]]]:
+        self._llamada("batch_get")
+        salida = []
+        with self._lock:
+            for rango in ranges:
+                # Solo se usan rangos de fila completa: "n:n"
+                n = int(rango.split(":")[0])
+                fila = _recortar(self._valores[n - 1]) if n <= len(self._valores) else []
+                salida.append([fila] if fila else [])
+        return salida
+
+    # ---- Escrituras ----
+    def append_row(self, values: List[Any], *args: Any, **kwargs: Any) -> None:
+        self._llamada("append_row")
+        with self._lock:
+            self._valores.append([str(v) for v in values])
+
+    def append_rows(self, values: List[List[Any]], *args: Any, **kwargs: Any) -> None:
+        self._llamada("append_rows")
+        with self._lock:
+            self._valores.extend([str(v) for v in fila] for fila in values)
+
+    def _escribir(self, a1: str, valores: List[List[Any]]) -> None:
+        fila, col = a1_to_rowcol(a1)
+        for desplazamiento, nuevos in enumerate(valores):
+            n = fila + desplazamiento
+            while len(self._valores) < n:
+                self._valores.append([])
+            actual = self._valores[n - 1]
+            actual.extend([""] * max(0, col - 1 + len(nuevos) - len(actual)))
+            actual[col - 1:col - 1 + len(nuevos)] = [str(v) for v in nuevos]
+
+    def update(self, range_name: str, values: Optional[List[List[Any]]] = None, *args: Any, **kwargs: Any) -> None:
+        self._llamada("update")
+        with self._lock:
+            self._escribir(range_name, values or [])
+
+    def batch_update(self, data: List[Dict[str, Any]], *args: Any, **kwargs: Any) -> None:
+        self._llamada("batch_update")
+        with self._lock:
+            for cambio in data:
+                self._escribir(cambio["range"], cambio["values"])
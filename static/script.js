@@ -8,7 +8,8 @@
     stats: 'stats', 
     conexion: 'conexion', 
     exportar: 'exportar', 
-    mutacion: 'mutacion' 
+    mutacion: 'mutacion',
+    filas: 'filas'
   };
 
   // ========== ESTADO GLOBAL ==========
@@ -18,7 +19,20 @@
     proyectoEditando: null,
     aborters: {},
     lastFocus: null,
-    estadisticasData: null
+    estadisticasData: null,
+    // Canal /eventos: versión del snapshot mostrado y vista actual. La versión
+    // solo es comparable dentro de una misma instancia (proceso) del servidor
+    version: null,
+    instancia: null,
+    instanciaEventos: null,
+    vista: 'todos',
+    termino: '',
+    eventos: null,
+    // Escrituras propias aún no confirmadas en Sheets (diario_id)
+    diarioPropios: new Set(),
+    diarioTimer: null,
+    // Cadena de eventos 'cambio' pendientes de aplicar (en orden)
+    cambios: Promise.resolve()
   };
 
   // ========== UTILIDADES ==========
@@ -281,25 +295,32 @@
     }
   }
 
-  async function cargarTodosLosProyectos({ silent = false } = {}) {
+  async function cargarTodosLosProyectos({ silent = false, version = null } = {}) {
     if (!silent) showLoadingResults();
     try {
-      const data = await fetchJSON('/mostrar_todos', { abortKey: ABORT_KEYS.todos });
+      // Con versión se evita la copia en caché del navegador tras un cambio
+      const url = version != null ? `/mostrar_todos?v=${version}` : '/mostrar_todos';
+      const data = await fetchJSON(url, { abortKey: ABORT_KEYS.todos });
       state.datos = Array.isArray(data.resultados) ? data.resultados : [];
+      state.version = data.version >= 0 ? data.version : null;
+      state.instancia = data.instancia ?? null;
+      state.vista = 'todos';
       renderResultados(state.datos);
       if (!silent) showMessage(`Se muestran todos los proyectos (${state.datos.length} registros)`, 'info');
       renderEstadisticasFallback();
+      return true;
     } catch (e) {
       showNoResults();
       showMessage(String(e.message || 'Error de conexión con el servidor'), 'error');
       console.error('Error cargando proyectos:', e);
+      return false;
     }
   }
 
-  async function buscarProyectos(termino) {
+  async function buscarProyectos(termino, { silent = false } = {}) {
     const query = (termino ?? el.searchInput?.value ?? '').trim();
     if (!query) return showMessage('Escribe algo para buscar', 'warning');
-    showLoadingResults();
+    if (!silent) showLoadingResults();
     try {
       const data = await fetchJSON('/buscar', {
         method: 'POST',
@@ -308,13 +329,17 @@
         abortKey: ABORT_KEYS.buscar
       });
       state.datos = Array.isArray(data.resultados) ? data.resultados : [];
+      state.vista = 'busqueda';
+      state.termino = query;
       renderResultados(state.datos);
-      showMessage(`Se encontraron ${state.datos.length} resultados para "${query}"`, 'info');
+      if (!silent) showMessage(`Se encontraron ${state.datos.length} resultados para "${query}"`, 'info');
       renderEstadisticasFallback();
+      return true;
     } catch (e) {
       showNoResults();
       showMessage(String(e.message || 'Error de conexion con el servidor'), 'error');
       console.error('Error buscando proyectos:', e);
+      return false;
     }
   }
 
@@ -427,9 +452,9 @@
   }
 
   // ========== DASHBOARD DE ESTADÍSTICAS ==========
-  async function cargarEstadisticasCompletas() {
+  async function cargarEstadisticasCompletas({ silent = false } = {}) {
     try {
-      showMessage('Cargando estadisticas...', 'info');
+      if (!silent) showMessage('Cargando estadisticas...', 'info');
 
       const data = await fetchJSON('/estadisticas-detalladas', {
         abortKey: ABORT_KEYS.stats
@@ -476,7 +501,7 @@
         updateTime.textContent = new Date().toLocaleString();
       }
 
-      showMessage('Estadísticas actualizadas correctamente', 'success');
+      if (!silent) showMessage('Estadísticas actualizadas correctamente', 'success');
 
     } catch (e) {
       console.error('Error cargando estadisticas completas:', e);
@@ -745,22 +770,33 @@
       if (modo === 'editar') {
         const numeroFilaInput = $('#numero_fila');
         if (numeroFilaInput) datos.numero_fila = numeroFilaInput.value;
+        if (state.proyectoEditando?.version) datos.version = state.proyectoEditando.version;
       }
-      await fetchJSON(url, {
+      const resp = await fetchJSON(url, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify(datos),
         abortKey: ABORT_KEYS.mutacion
       });
+      if (resp?.diario_id != null) {
+        state.diarioPropios.add(resp.diario_id);
+        programarVerificacionDiario();
+      }
       if (modo === 'editar') {
-        showMessage('Proyecto actualizado exitosamente en Google Sheets', 'success');
+        showMessage('Cambios guardados; se sincronizarán con Google Sheets en breve', 'success');
         cancelarEdicion();
       } else {
-        showMessage('Proyecto agregado exitosamente a Google Sheets', 'success');
+        showMessage('Proyecto guardado; se sincronizará con Google Sheets en breve', 'success');
         el.addForm.reset();
       }
-      await Promise.all([cargarEstadisticasCompletas(), cargarTodosLosProyectos({ silent: true })]);
-      renderResultados(state.datos);
+      // El cambio llega por /eventos solo si el canal abierto es del mismo proceso
+      // que aceptó la escritura; si no, se recarga como siempre
+      const porEventos = state.eventos?.readyState === 1 // 1 = EventSource.OPEN
+        && resp?.instancia != null && resp.instancia === state.instanciaEventos;
+      if (!porEventos) {
+        await Promise.all([cargarEstadisticasCompletas(), cargarTodosLosProyectos({ silent: true })]);
+        renderResultados(state.datos);
+      }
     } catch (e) {
       showMessage(String(e.message || `Error al ${modo === 'editar' ? 'actualizar' : 'agregar'} el proyecto`), 'error');
       console.error(e);
@@ -916,6 +952,137 @@
     return 'estado-default';
   }
 
+  // ========== CAMBIOS EN TIEMPO REAL (SSE) ==========
+  const refrescarEstadisticas = debounce(() => cargarEstadisticasCompletas({ silent: true }), 1000);
+
+  // Los eventos se aplican de a uno: un /filas en curso nunca se aborta por el
+  // siguiente evento y la versión solo avanza cuando las filas ya se pintaron
+  function encolarCambio(evento) {
+    state.cambios = state.cambios
+      .then(() => aplicarCambio(evento))
+      .catch(err => console.error('Error aplicando cambios:', err));
+  }
+
+  async function recargarVista(evento) {
+    const ok = state.vista === 'busqueda'
+      ? await buscarProyectos(state.termino, { silent: true })
+      : await cargarTodosLosProyectos({ silent: true, version: `${evento.instancia}-${evento.version}` });
+    // Si la recarga falla, sin versión el próximo evento vuelve a recargar todo
+    state.version = ok ? evento.version : null;
+    state.instancia = ok ? evento.instancia : null;
+  }
+
+  async function aplicarCambio(evento) {
+    const otraInstancia = evento.instancia !== state.instancia;
+    if (!otraInstancia && state.version != null && evento.version <= state.version) return;
+    const salto = otraInstancia || state.version == null || evento.version !== state.version + 1;
+    refrescarEstadisticas();
+
+    // Si se perdieron eventos, cambió demasiado o el servidor es otro proceso, se recarga todo
+    if (evento.completo || salto) return recargarVista(evento);
+
+    const ids = state.vista === 'todos'
+      ? evento.filas
+      : evento.filas.filter(n => state.datos.some(p => p.numero_fila === n));
+    if (!ids.length && state.vista === 'busqueda') {
+      state.version = evento.version;
+      return;
+    }
+
+    try {
+      const data = await fetchJSON(`/filas?ids=${ids.join(',')}`, { abortKey: ABORT_KEYS.filas });
+      const porFila = new Map((data.resultados || []).map(p => [p.numero_fila, p]));
+      state.datos = state.datos
+        .map(p => porFila.get(p.numero_fila) || p)
+        .filter(p => p.numero_fila <= data.total + 1);
+      if (state.vista === 'todos') {
+        const existentes = new Set(state.datos.map(p => p.numero_fila));
+        porFila.forEach((p, n) => { if (!existentes.has(n)) state.datos.push(p); });
+        state.datos.sort((a, b) => a.numero_fila - b.numero_fila);
+      }
+      renderResultados(state.datos);
+      state.version = evento.version;
+    } catch (e) {
+      console.error('Error aplicando cambios:', e);
+      await recargarVista(evento);
+    }
+  }
+
+  // La escritura se acepta en el diario del servidor y llega a Sheets después;
+  // si allí resulta en conflicto o falla, se avisa y se recarga la vista
+  function avisarDiario(entrada) {
+    if (!state.diarioPropios.has(entrada.id) || entrada.estado === 'pendiente') return;
+    state.diarioPropios.delete(entrada.id);
+    if (entrada.estado === 'aplicado') return;
+    const fila = entrada.numero_fila ? ` (fila ${entrada.numero_fila})` : '';
+    const motivo = entrada.estado === 'conflicto'
+      ? 'otra persona modificó la fila antes; recargue y vuelva a editar'
+      : (entrada.error || 'Google Sheets rechazó el cambio');
+    showMessage(`Un cambio guardado no se aplicó en Google Sheets${fila}: ${motivo}`, 'error');
+    if (state.vista === 'busqueda') buscarProyectos(state.termino, { silent: true });
+    else cargarTodosLosProyectos({ silent: true, version: Date.now() });
+  }
+
+  async function verificarDiario() {
+    clearTimeout(state.diarioTimer);
+    state.diarioTimer = null;
+    if (!state.diarioPropios.size) return;
+    try {
+      const data = await fetchJSON(`/diario?ids=${[...state.diarioPropios].join(',')}`);
+      (data.entradas || []).forEach(avisarDiario);
+    } catch (e) {
+      console.error('Error consultando el diario:', e);
+    }
+    programarVerificacionDiario();
+  }
+
+  function programarVerificacionDiario() {
+    if (state.diarioTimer || !state.diarioPropios.size) return;
+    state.diarioTimer = setTimeout(verificarDiario, 10000);
+  }
+
+  function conectarEventos() {
+    if (!window.EventSource) return;
+    state.eventos = new EventSource('/eventos');
+    // Si el servidor rechaza el canal (p. ej. 503 por tope de conexiones) el
+    // EventSource queda cerrado: se sigue recargando tras cada guardado y se
+    // reintenta conectar más tarde
+    state.eventos.addEventListener('error', () => {
+      if (state.eventos?.readyState !== 2) return; // 2 = EventSource.CLOSED
+      state.eventos = null;
+      setTimeout(conectarEventos, 60000);
+    });
+    // Se recibe al conectar y en cada reconexión: si el proceso o la versión no
+    // coinciden con lo mostrado (reinicio, otro worker), se recarga la vista
+    state.eventos.addEventListener('version', (e) => {
+      try {
+        const inicial = JSON.parse(e.data);
+        state.instanciaEventos = inicial.instancia;
+        const cargando = state.version == null && state.instancia == null;
+        if (!cargando && (inicial.instancia !== state.instancia || inicial.version !== state.version)) {
+          encolarCambio({ ...inicial, filas: [], completo: true });
+        }
+        verificarDiario();
+      } catch (err) {
+        console.error('Evento inválido:', err);
+      }
+    });
+    state.eventos.addEventListener('cambio', (e) => {
+      try {
+        encolarCambio(JSON.parse(e.data));
+      } catch (err) {
+        console.error('Evento inválido:', err);
+      }
+    });
+    state.eventos.addEventListener('diario', (e) => {
+      try {
+        avisarDiario(JSON.parse(e.data));
+      } catch (err) {
+        console.error('Evento inválido:', err);
+      }
+    });
+  }
+
   // ========== EVENTOS ==========
   function bindEvents() {
     // Búsqueda
@@ -993,5 +1160,6 @@
     verificarConexion();
     cargarEstadisticasCompletas();
     cargarTodosLosProyectos();
+    conectarEventos();
   });
 })();
\ No newline at end of file
@@ -0,0 +1,68 @@
+"""Fixtures compartidas: la app contra una hoja falsa en memoria y un diario temporal."""
+from __future__ import annotations
+
+import json
+
+import pytest
+import requests
+from gspread.exceptions import APIError
+
+import app as proyectos
+from benchmarks.fake_sheets import FakeWorksheet, generar_filas
+
+
+class HojaControlada(FakeWorksheet):
+    """Hoja falsa que puede simular una caída o rechazar filas con HTTP 400."""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.caida = False
+        self.rechazar = "RECHAZAR"
+
+    def _llamada(self, operacion: str) -> None:
+        if self.caida:
+            raise requests.exceptions.ConnectionError("Sheets no disponible (simulado)")
+        super()._llamada(operacion)
+
+    def _validar(self, filas) -> None:
+        if any(self.rechazar in str(v) for fila in filas for v in fila):
+            resp = requests.Response()
+            resp.status_code = 400
+            resp._content = json.dumps({"error": {
+                "code": 400, "status": "INVALID_ARGUMENT", "message": "Valor rechazado (simulado)",
+            }}).encode("utf-8")
+            raise APIError(resp)
+
+    def append_rows(self, values, *args, **kwargs) -> None:
+        self._validar(values)
+        super().append_rows(values, *args, **kwargs)
+
+    def batch_update(self, data, *args, **kwargs) -> None:
+        self._validar([c["values"][0] for c in data])
+        super().batch_update(data, *args, **kwargs)
+
+
+@pytest.fixture
+def hoja(tmp_path):
+    config_previa = dict(proyectos.app.config)
+    proyectos.app.config.update(
+        JOURNAL_PATH=str(tmp_path / "diario.sqlite3"),
+        LOCAL_DATA_JSON=str(tmp_path / "sin_respaldo.json"),
+        JOURNAL_WORKER=False,
+        JOURNAL_MAX_ATTEMPTS=3,
+    )
+    ws = HojaControlada(generar_filas(3, seed=1))
+    proyectos.set_worksheet_factory(lambda: ws)
+    yield ws
+    proyectos.app.config["JOURNAL_WORKER"] = False
+    proyectos._journal_wakeup.set()
+    if proyectos._journal_thread is not None:
+        proyectos._journal_thread.join(timeout=5)
+    proyectos.set_worksheet_factory(None)
+    proyectos.app.config.clear()
+    proyectos.app.config.update(config_previa)
+
+
+@pytest.fixture
+def client(hoja):
+    return proyectos.app.test_client()
@@ -0,0 +1,209 @@
+"""Reproducción del diario de escrituras contra una hoja falsa en memoria."""
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+
+import pytest
+import requests
+
+import app as proyectos
+
+
+def _payload(nombre: str, **extra):
+    return {"proyecto_articulo": nombre, "estudiante1": "Ana Gómez", **extra}
+
+
+def _registros(client):
+    return client.get("/mostrar_todos").get_json()["resultados"]
+
+
+def _diario(*ids):
+    return {e["id"]: e for e in proyectos.journal_entries(list(ids))}
+
+
+def test_reproduce_en_orden(client, hoja):
+    _registros(client)
+    hoja.caida = True
+    ids = [
+        client.post("/agregar", json=_payload("Nuevo A")).get_json()["diario_id"],
+        client.post("/actualizar", json=_payload("Editado 2", numero_fila=2)).get_json()["diario_id"],
+        client.post("/agregar", json=_payload("Nuevo B")).get_json()["diario_id"],
+    ]
+    with pytest.raises(requests.exceptions.ConnectionError):
+        proyectos.replay_journal()
+    assert proyectos.journal_stats()["pendientes"] == 3
+
+    hoja.caida = False
+    assert proyectos.replay_journal() == 3
+    titulos = [f[0] for f in hoja._valores[1:]]
+    assert titulos[0] == "Editado 2"
+    assert titulos[-2:] == ["Nuevo A", "Nuevo B"]
+    assert all(e["estado"] == "aplicado" for e in _diario(*ids).values())
+
+
+def test_editar_fila_agregada_aun_no_enviada(client, hoja):
+    _registros(client)
+    hoja.caida = True
+    assert client.post("/agregar", json=_payload("Nuevo")).status_code == 200
+    nuevo = _registros(client)[-1]
+    resp = client.post("/actualizar", json=_payload(
+        "Nuevo corregido", numero_fila=nuevo["numero_fila"], version=nuevo["version"],
+    ))
+    assert resp.status_code == 200
+
+    hoja.caida = False
+    proyectos.replay_journal()
+    assert hoja._valores[nuevo["numero_fila"] - 1][0] == "Nuevo corregido"
+    stats = proyectos.journal_stats()
+    assert stats["pendientes"] == 0
+    assert stats["conflictos"] == 0
+
+
+def test_conflicto_queda_registrado_y_no_sobrescribe(client, hoja):
+    fila = _registros(client)[0]
+    entry_id = client.post("/actualizar", json=_payload(
+        "Mi edición", numero_fila=fila["numero_fila"], version=fila["version"],
+    )).get_json()["diario_id"]
+    hoja._valores[1][0] = "Edición de otra persona"
+
+    proyectos.replay_journal()
+    assert hoja._valores[1][0] == "Edición de otra persona"
+    assert _diario(entry_id)[entry_id]["estado"] == "conflicto"
+    entradas = client.get(f"/diario?ids={entry_id}").get_json()["entradas"]
+    assert entradas[0]["estado"] == "conflicto"
+
+
+def test_actualizar_rechaza_fila_fuera_de_rango(client):
+    total = len(_registros(client))
+    for numero_fila in (-1, 1, total + 2, "x"):
+        resp = client.post("/actualizar", json=_payload("X", numero_fila=numero_fila))
+        assert resp.status_code == 400
+    assert proyectos.journal_stats()["pendientes"] == 0
+
+
+def test_entrada_invalida_no_bloquea_el_diario(client, hoja):
+    _registros(client)
+    malo = proyectos.journal_record("update", _payload("Fila imposible"), -1)
+    bueno = client.post("/agregar", json=_payload("Después")).get_json()["diario_id"]
+
+    proyectos.replay_journal()
+    estados = _diario(malo, bueno)
+    assert estados[malo]["estado"] == "fallido"
+    assert estados[bueno]["estado"] == "aplicado"
+    assert hoja._valores[-1][0] == "Después"
+
+
+def test_rechazo_solo_cuenta_a_la_entrada_culpable(client, hoja):
+    _registros(client)
+    ids = [
+        client.post("/agregar", json=_payload(nombre)).get_json()["diario_id"]
+        for nombre in ("Primero", "RECHAZAR este", "Tercero")
+    ]
+    proyectos.replay_journal()
+    estados = _diario(*ids)
+    assert [estados[i]["estado"] for i in ids] == ["aplicado", "pendiente", "aplicado"]
+    conn = sqlite3.connect(proyectos.app.config["JOURNAL_PATH"])
+    intentos = dict(conn.execute("SELECT id, intentos FROM diario").fetchall())
+    conn.close()
+    assert [intentos[i] for i in ids] == [0, 1, 0]
+
+    for _ in range(proyectos.app.config["JOURNAL_MAX_ATTEMPTS"]):
+        proyectos.replay_journal()
+    assert _diario(ids[1])[ids[1]]["estado"] == "fallido"
+    assert [f[0] for f in hoja._valores[-2:]] == ["Primero", "Tercero"]
+
+
+def test_caida_no_consume_intentos(client, hoja):
+    _registros(client)
+    entry_id = client.post("/agregar", json=_payload("Nuevo")).get_json()["diario_id"]
+    hoja.caida = True
+    for _ in range(proyectos.app.config["JOURNAL_MAX_ATTEMPTS"] + 1):
+        with pytest.raises(requests.exceptions.ConnectionError):
+            proyectos.replay_journal()
+    assert _diario(entry_id)[entry_id]["estado"] == "pendiente"
+
+
+def test_pendientes_se_reproducen_tras_reinicio(client, hoja):
+    # Entrada que quedó en el diario de un proceso anterior
+    conn = sqlite3.connect(proyectos.app.config["JOURNAL_PATH"])
+    proyectos._journal_conn().close()
+    conn.execute(
+        "INSERT INTO diario (ts, op, payload) VALUES (?, 'append', ?)",
+        (time.time(), json.dumps(_payload("De antes del reinicio"))),
+    )
+    conn.commit()
+    conn.close()
+
+    proyectos.app.config.update(JOURNAL_WORKER=True, JOURNAL_RETRY_SECONDS=0.05)
+    client.get("/health")
+    limite = time.time() + 5
+    while proyectos.journal_stats()["pendientes"] and time.time() < limite:
+        time.sleep(0.05)
+    assert proyectos.journal_stats()["pendientes"] == 0
+    assert hoja._valores[-1][0] == "De antes del reinicio"
+
+
+def test_lote_rechaza_filas_pendientes_y_faltantes(client, hoja):
+    registros = _registros(client)
+    client.post("/actualizar", json=_payload("Pendiente", numero_fila=2))
+    client.post("/agregar", json=_payload("Solo en el diario"))
+    pendiente, intacta = _registros(client)[0], registros[1]
+    nueva = _registros(client)[-1]
+
+    resp = client.post("/actualizar_lote", json={"items": [
+        {"numero_fila": 2, "version": pendiente["version"], "trabajo_final": "Aprobado"},
+        {"numero_fila": nueva["numero_fila"], "version": nueva["version"], "trabajo_final": "Aprobado"},
+        {"numero_fila": intacta["numero_fila"], "version": intacta["version"], "trabajo_final": "Aprobado"},
+    ]}).get_json()
+    errores = {r["numero_fila"]: r["error"] for r in resp["rechazados"]}
+    assert "pendientes de sincronizar" in errores[2]
+    assert "pendiente de sincronizar" in errores[nueva["numero_fila"]]
+    assert resp["actualizados"] == [intacta["numero_fila"]]
+
+    proyectos.replay_journal()
+    resp = client.post("/actualizar_lote", json={"items": [
+        {"numero_fila": 99, "version": intacta["version"], "trabajo_final": "Aprobado"},
+    ]}).get_json()
+    assert resp["rechazados"][0]["error"] == "La fila no existe en la hoja"
+
+
+def test_respaldo_local_exige_version_para_editar(client, hoja):
+    _registros(client)
+    hoja.caida = True
+    client.post("/agregar", json=_payload("Pendiente"))
+    with proyectos._cache_lock:
+        proyectos._cache_data["ts"] = 0.0
+    fila = _registros(client)[0]
+    assert fila["hoja_origen"] == "LOCAL"
+
+    resp = client.post("/actualizar", json=_payload("A ciegas", numero_fila=fila["numero_fila"]))
+    assert resp.status_code == 409
+    resp = client.post("/actualizar", json=_payload(
+        "Con versión", numero_fila=fila["numero_fila"], version=fila["version"],
+    ))
+    assert resp.status_code == 200
+
+
+def test_altas_concurrentes_respetan_el_orden_del_diario(client, hoja):
+    _registros(client)
+    ids = []
+
+    def agregar(i):
+        with proyectos.app.test_client() as c:
+            ids.append((c.post("/agregar", json=_payload(f"Concurrente {i}")).get_json()["diario_id"], i))
+
+    hilos = [threading.Thread(target=agregar, args=(i,)) for i in range(20)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+
+    esperado = [f"Concurrente {i}" for _, i in sorted(ids)]
+    with proyectos._cache_lock:
+        servido = [f[0] for f in proyectos._cache_data["rows"][-20:]]
+    assert servido == esperado
+    proyectos.replay_journal()
+    assert [f[0] for f in hoja._valores[-20:]] == esperado
@@ -0,0 +1,25 @@
+"""Canal /eventos: tope de suscriptores."""
+from __future__ import annotations
+
+import app as proyectos
+
+
+def test_tope_de_suscriptores(client):
+    proyectos.app.config["EVENTOS_MAX_SUSCRIPTORES"] = 1
+    abierta = client.get("/eventos")
+    flujo = iter(abierta.response)
+    assert b"event: version" in next(flujo)
+
+    rechazada = client.get("/eventos")
+    assert rechazada.status_code == 503
+    assert rechazada.headers["Retry-After"] == "60"
+
+    # Al cerrarse la primera conexión se libera su lugar
+    flujo.close()
+    abierta.close()
+    siguiente = client.get("/eventos")
+    assert siguiente.status_code == 200
+    flujo = iter(siguiente.response)
+    next(flujo)
+    flujo.close()
+    assert not proyectos._suscriptores